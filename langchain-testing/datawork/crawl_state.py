@@ -0,0 +1,159 @@
+# pylint: disable=E0401
+
+"""
+This module keeps the state of a Google Places crawl in SQLite, so an interrupted or
+repeated crawl only fetches what is missing.
+
+Every search query is recorded once it completed, and every place found is recorded with
+its search result and a status: pending (details not fetched yet), fetched (the restaurant
+with its reviews is stored) or failed (retried on the next run, up to a number of attempts).
+
+Places are keyed by place id, so overlapping searches ("Little Tokyo", "Koreatown") never
+fetch the same place twice. A fingerprint of the search result detects places that changed
+since they were fetched (new reviews move the rating and review count), which are fetched again.
+Fetched restaurants are exported as a JSON Lines dataset (see utils/dataset.py).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from utils.dataset import write_restaurants
+
+PENDING, FETCHED, FAILED = 'pending', 'fetched', 'failed'
+
+# Search result fields whose change means the place details are worth fetching again
+FINGERPRINT_FIELDS = ('displayName', 'formattedAddress', 'types', 'rating', 'userRatingCount',
+                      'priceLevel', 'location')
+
+def place_fingerprint(place):
+    """Hash the fields of a search result that matter to the restaurant entry."""
+    content = json.dumps([place.get(field) for field in FINGERPRINT_FIELDS], sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+class CrawlState:
+    """SQLite-backed record of completed search queries and of every place's fetch status."""
+
+    def __init__(self, path):
+        """Open or create the state database at `path`."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS queries ("
+                "query TEXT PRIMARY KEY, completed_at REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS places ("
+                "place_id TEXT PRIMARY KEY, place TEXT NOT NULL, status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, restaurant TEXT, updated_at REAL NOT NULL, "
+                "fingerprint TEXT)"
+            )
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(places)")]
+            if 'fingerprint' not in columns:
+                self.conn.execute("ALTER TABLE places ADD COLUMN fingerprint TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS places_status_idx ON places (status)")
+
+    def query_done(self, query, max_age=None):
+        """
+        Return True if the search query already completed, less than `max_age` seconds ago
+        if given. Older searches are due to run again, so changed places are detected.
+        """
+        row = self.conn.execute("SELECT completed_at FROM queries WHERE query = ?",
+                                (query,)).fetchone()
+        if row is None:
+            return False
+        return max_age is None or time.time() - row[0] < max_age
+
+    def add_places(self, query, places):
+        """
+        Record the places found by a search query and mark the query completed. New places
+        and places whose fingerprint changed become pending, duplicates are skipped.
+        Returns the number of new, changed and duplicate places.
+        """
+        now = time.time()
+        # A search can return the same place twice, the last result wins
+        unique = {place['id']: place for place in places}
+        counts = {'new': 0, 'changed': 0, 'duplicate': len(places) - len(unique)}
+        with self.conn:
+            for place_id, place in unique.items():
+                fingerprint = place_fingerprint(place)
+                row = self.conn.execute("SELECT fingerprint FROM places WHERE place_id = ?",
+                                        (place_id,)).fetchone()
+                if row is None:
+                    counts['new'] += 1
+                    self.conn.execute(
+                        "INSERT INTO places (place_id, place, status, updated_at, fingerprint) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (place_id, json.dumps(place), PENDING, now, fingerprint)
+                    )
+                elif row[0] is None:
+                    # Recorded before fingerprints existed, assume it is up to date
+                    counts['duplicate'] += 1
+                    self.conn.execute("UPDATE places SET fingerprint = ? WHERE place_id = ?",
+                                      (fingerprint, place_id))
+                elif row[0] != fingerprint:
+                    counts['changed'] += 1
+                    self.conn.execute(
+                        "UPDATE places SET place = ?, status = ?, attempts = 0, updated_at = ?, "
+                        "fingerprint = ? WHERE place_id = ?",
+                        (json.dumps(place), PENDING, now, fingerprint, place_id)
+                    )
+                else:
+                    counts['duplicate'] += 1
+            self.conn.execute("INSERT OR REPLACE INTO queries (query, completed_at) VALUES (?, ?)",
+                              (query, now))
+        return counts
+
+    def to_fetch(self, max_attempts=3):
+        """Return the search results of the pending places and of the failed ones to retry."""
+        rows = self.conn.execute(
+            "SELECT place FROM places WHERE status = ? OR (status = ? AND attempts < ?) "
+            "ORDER BY rowid",
+            (PENDING, FAILED, max_attempts)
+        )
+        return [json.loads(place) for (place,) in rows]
+
+    def mark_fetched(self, place_id, restaurant):
+        """Store the fetched restaurant of a place."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE places SET status = ?, restaurant = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE place_id = ?",
+                (FETCHED, json.dumps(restaurant, ensure_ascii=False), time.time(), place_id)
+            )
+
+    def mark_failed(self, place_id):
+        """Record a failed fetch of a place."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE places SET status = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE place_id = ?",
+                (FAILED, time.time(), place_id)
+            )
+
+    def counts(self):
+        """Return the number of places in every status."""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM places GROUP BY status"))
+
+    def restaurants(self):
+        """
+        Yield the fetched restaurants in crawl order. A changed place keeps its last fetched
+        restaurant until it is fetched again.
+        """
+        rows = self.conn.execute(
+            "SELECT restaurant FROM places WHERE restaurant IS NOT NULL ORDER BY rowid"
+        )
+        for (restaurant,) in rows:
+            yield json.loads(restaurant)
+
+    def export(self, path):
+        """Write the fetched restaurants to a JSON Lines dataset, returns how many were written."""
+        return write_restaurants(path, self.restaurants())
+
+    def close(self):
+        """Close the database."""
+        self.conn.close()
@@ -0,0 +1,101 @@
+# pylint: disable=E0401
+
+"""
+This module runs a local stub of the Google Places endpoints used by webscraper_v2,
+so crawls can be exercised without an API key or quota.
+
+It serves deterministic fake places and reviews, and answers a share of requests with
+429 or 503 to exercise the crawler's retries.
+
+Example:
+    python langchain-testing/datawork/places_stub.py --port 8765 --fail-rate 0.2
+    PLACES_API_URL=http://localhost:8765 MAPS_API_URL=http://localhost:8765 python ...
+"""
+
+import argparse
+import json
+import random
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE = 20
+
+def fake_place(query, number):
+    """Build a fake Places API (New) place for a search query."""
+    place_id = f"stub-{zlib.crc32(query.encode('utf-8')) % 10000}-{number}"
+    return {
+        'id': place_id,
+        'displayName': {'text': f'Stub Restaurant {number}'},
+        'formattedAddress': f'{number} Stub St, Los Angeles, CA 90012, USA',
+        'types': ['restaurant', 'food', 'point_of_interest', 'establishment'],
+        'rating': round(3 + (number % 20) / 10, 1),
+        'userRatingCount': 100 + number,
+        'priceLevel': 'PRICE_LEVEL_MODERATE',
+        'location': {'latitude': 34.05 + number / 1000, 'longitude': -118.24 - number / 1000},
+    }
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler serving the searchText and place details endpoints."""
+
+    fail_rate = 0.0
+    total_results = 60
+
+    def send_json(self, status, body, headers=None):
+        """Write a JSON response."""
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def maybe_fail(self):
+        """Answer with 429 or 503 for a share of requests, returns True if it did."""
+        if random.random() >= self.fail_rate:
+            return False
+        if random.random() < 0.5:
+            self.send_json(429, {'error': 'RESOURCE_EXHAUSTED'}, {'Retry-After': '0'})
+        else:
+            self.send_json(503, {'error': 'UNAVAILABLE'})
+        return True
+
+    def do_POST(self):  # pylint: disable=C0103
+        """Serve /v1/places:searchText with pagination."""
+        if self.maybe_fail():
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        start = int(body.get('pageToken', 0))
+        end = min(start + body.get('pageSize', PAGE_SIZE), self.total_results)
+        result = {'places': [fake_place(body.get('textQuery', ''), n) for n in range(start, end)]}
+        if end < self.total_results:
+            result['nextPageToken'] = str(end)
+        self.send_json(200, result)
+
+    def do_GET(self):  # pylint: disable=C0103
+        """Serve /maps/api/place/details/json."""
+        if self.maybe_fail():
+            return
+        params = parse_qs(urlparse(self.path).query)
+        place_id = params.get('place_id', [''])[0]
+        reviews = [{'text': f'Review {n} of {place_id}. The food was great.'} for n in range(5)]
+        self.send_json(200, {'status': 'OK', 'result': {'reviews': reviews}})
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        """Keep the console quiet."""
+
+def serve(port=8765, fail_rate=0.0):
+    """Create the stub server, call serve_forever to run it."""
+    StubHandler.fail_rate = fail_rate
+    return ThreadingHTTPServer(('localhost', port), StubHandler)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local Google Places stub server.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help='Share of requests answered with 429 or 503.')
+    args = parser.parse_args()
+    print(f'Serving the Places stub on http://localhost:{args.port}')
+    serve(args.port, args.fail_rate).serve_forever()
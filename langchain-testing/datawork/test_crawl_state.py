@@ -0,0 +1,77 @@
+# pylint: disable=E0401
+# pylint: disable=C0114
+
+import os
+import tempfile
+from unittest import TestCase, mock
+from crawl_state import FAILED, FETCHED, PENDING, CrawlState
+from places_stub import fake_place
+from utils.dataset import read_restaurants
+
+
+class CrawlStateTests(TestCase):
+    """
+    Checks that an interrupted crawl resumes from its state file and that completed
+    searches expire after max_age.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, 'state', 'crawl_state.sqlite3')
+        self.places = [fake_place('ramen', n) for n in range(4)]
+
+    def open(self):
+        state = CrawlState(self.path)
+        self.addCleanup(state.close)
+        return state
+
+    def test_resumes_with_the_places_left_to_fetch(self):
+        state = self.open()
+        self.assertEqual(state.add_places('ramen', self.places + self.places[:1]),
+                         {'new': 4, 'changed': 0, 'duplicate': 1})
+        state.mark_fetched(self.places[0]['id'], {'place_id': self.places[0]['id']})
+        state.mark_failed(self.places[1]['id'])
+        state.close()  # the crawl stops here
+
+        state = self.open()
+        self.assertTrue(state.query_done('ramen'))
+        self.assertEqual(state.counts(), {PENDING: 2, FETCHED: 1, FAILED: 1})
+        self.assertEqual([place['id'] for place in state.to_fetch()],
+                         [place['id'] for place in self.places[1:]])
+        # Failed places are retried until they run out of attempts
+        self.assertEqual([place['id'] for place in state.to_fetch(max_attempts=1)],
+                         [place['id'] for place in self.places[2:]])
+
+        for place in self.places[1:]:
+            state.mark_fetched(place['id'], {'place_id': place['id']})
+        self.assertEqual(state.to_fetch(), [])
+        output_path = os.path.join(self.directory, 'restaurants.jsonl')
+        self.assertEqual(state.export(output_path), 4)
+        self.assertEqual([r['place_id'] for r in read_restaurants(output_path)],
+                         [place['id'] for place in self.places])
+
+    def test_completed_searches_expire_after_max_age(self):
+        state = self.open()
+        self.assertFalse(state.query_done('ramen'))
+        with mock.patch('crawl_state.time.time', return_value=1000.0):
+            state.add_places('ramen', self.places)
+        with mock.patch('crawl_state.time.time', return_value=1000.0 + 3599):
+            self.assertTrue(state.query_done('ramen', max_age=3600))
+        with mock.patch('crawl_state.time.time', return_value=1000.0 + 3600):
+            self.assertFalse(state.query_done('ramen', max_age=3600))
+            self.assertTrue(state.query_done('ramen'))
+
+    def test_expired_search_detects_changed_places(self):
+        state = self.open()
+        state.add_places('ramen', self.places)
+        for place in self.places:
+            state.mark_fetched(place['id'], {'place_id': place['id']})
+
+        changed = {**self.places[1], 'userRatingCount': self.places[1]['userRatingCount'] + 1}
+        self.assertEqual(state.add_places('ramen', [self.places[0], changed, *self.places[2:]]),
+                         {'new': 0, 'changed': 1, 'duplicate': 3})
+        self.assertEqual([place['id'] for place in state.to_fetch()], [changed['id']])
+        # The changed place keeps its last fetched restaurant until it is fetched again
+        self.assertEqual(len(list(state.restaurants())), 4)
@@ -0,0 +1,68 @@
+# pylint: disable=E0401
+# pylint: disable=C0114
+
+import random
+import threading
+from unittest import TestCase, mock
+import places_stub
+import webscraper_v2
+
+
+class CrawlerTests(TestCase):
+    """
+    Checks that the place details crawler retries throttled and failing requests,
+    against the local Places stub answering 30% of requests with 429 or 503.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = places_stub.serve(0, fail_rate=0.3)
+        cls.url = f'http://localhost:{cls.server.server_address[1]}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.statuses = []
+        send_json = places_stub.StubHandler.send_json
+
+        def record(handler, status, body, headers=None):
+            self.statuses.append(status)
+            send_json(handler, status, body, headers)
+
+        for target, name, value in ((webscraper_v2, 'PLACES_API_URL', self.url),
+                                    (webscraper_v2, 'MAPS_API_URL', self.url),
+                                    (places_stub.StubHandler, 'send_json', record),
+                                    # The stub fails the same requests on every run
+                                    (places_stub, 'random', random.Random(0)),
+                                    # Skip the backoff delays, the stub's Retry-After is 0
+                                    (webscraper_v2.random, 'uniform', mock.Mock(return_value=0))):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_crawl_fetches_every_place(self):
+        place_ids = [f'stub-{n}' for n in range(30)]
+        details = dict(webscraper_v2.crawl_place_details(place_ids, 'key', concurrency=4,
+                                                         qps=1000, max_retries=10))
+        self.assertEqual(list(details), place_ids)
+        self.assertTrue(all(d and len(d['reviews']) == 5 for d in details.values()))
+        self.assertIn(429, self.statuses)
+        self.assertIn(503, self.statuses)
+
+    def test_retries_429_and_503_until_attempts_run_out(self):
+        with mock.patch.object(places_stub.StubHandler, 'fail_rate', 1.0):
+            with webscraper_v2.create_session() as session:
+                response = webscraper_v2.request_with_retry(
+                    session, 'GET', f'{self.url}/maps/api/place/details/json', max_retries=6,
+                    params={'place_id': 'stub-0'}
+                )
+        self.assertIn(response.status_code, (429, 503))
+        self.assertEqual(len(self.statuses), 6)
+        self.assertTrue(set(self.statuses) <= {429, 503})
+
@@ -4,12 +4,97 @@
 This module provides functionality to interact with the Google Places API.
 It includes functions to search for places, retrieve place details, 
 and handle the configuration file.
+
+Search results and fetched restaurants are recorded in a crawl state (see crawl_state.py),
+so re-runs skip recently completed searches and fetched places, and the output is written
+as JSON Lines. Searches older than QUERY_MAX_AGE (or all of them with --refresh) run again,
+so places whose rating or review count changed are fetched again.
+Place details are crawled concurrently over a pooled HTTP session, under a token-bucket
+QPS limit, and requests are retried with exponential backoff and jitter on 429 and 5xx.
+The API base URLs can be overridden with PLACES_API_URL and MAPS_API_URL, e.g. to crawl
+a local stub server (see places_stub.py).
 """
 
+import argparse
 import json
 import os
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from utils.dataset import read_restaurants
+from crawl_state import CrawlState, FETCHED
+
+PLACES_API_URL = os.getenv('PLACES_API_URL', 'https://places.googleapis.com')
+MAPS_API_URL = os.getenv('MAPS_API_URL', 'https://maps.googleapis.com')
+
+CRAWL_CONCURRENCY = 8       # Place details requests in flight at the same time
+CRAWL_QPS = 10              # Sustained requests per second, bursts up to CRAWL_QPS
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+QUERY_MAX_AGE = 7 * 24 * 3600  # Seconds before a completed search is run again
+
+CRAWL_STATE_PATH = 'test_data/medium-meh/crawl_state.sqlite3'
+RESTAURANTS_PATH = 'test_data/medium-meh/restaurants_with_reviews.jsonl'
+LEGACY_RESTAURANTS_PATH = 'test_data/medium-meh/restaurants.json'
+
+class TokenBucket:
+    """Thread-safe token bucket, acquire blocks until a request may be sent."""
+
+    def __init__(self, rate, capacity=None):
+        """Allow `rate` requests per second with bursts of up to `capacity` requests."""
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def create_session(concurrency=CRAWL_CONCURRENCY):
+    """Create an HTTP session keeping up to `concurrency` connections alive per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def request_with_retry(session, method, url, bucket=None, max_retries=MAX_RETRIES, **kwargs):
+    """
+    Send a request, retrying connection errors, 429 and 5xx with full-jitter exponential
+    backoff (honoring Retry-After). Returns the last response, None if it never connected.
+    """
+    response = None
+    for attempt in range(max_retries):
+        if bucket:
+            bucket.acquire()
+        try:
+            response = session.request(method, url, timeout=10, **kwargs)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            retry_after = response.headers.get('Retry-After')
+        except (requests.ConnectionError, requests.Timeout):
+            response, retry_after = None, None
+
+        if attempt + 1 < max_retries:
+            delay = random.uniform(0, min(30, 0.5 * 2 ** attempt))
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            time.sleep(delay)
+    return response
 
 def find_config_file(filename='config.json'):
     """Search for the configuration file in the current directory or parent directories."""
@@ -35,15 +120,16 @@ def get_google_places_key():
         api_key = config['PLACES_API_KEY']
     return api_key
 
-def get_google_search_places(api_key, query, max_results=100):
+def get_google_search_places(api_key, query, max_results=100, session=None, bucket=None):
     """Search for places using the Google Places API based on a query."""
-    url = 'https://places.googleapis.com/v1/places:searchText'
+    url = f'{PLACES_API_URL}/v1/places:searchText'
+    session = session or create_session()
     headers = {
         'Content-Type': 'application/json',
         'X-Goog-Api-Key': api_key,
         'X-Goog-FieldMask': "places.id,places.displayName,places.formattedAddress,"
                             "places.types,places.rating,places.userRatingCount,"
-                            "places.priceLevel,nextPageToken"
+                            "places.priceLevel,places.location,nextPageToken"
     }
     data = {
         "textQuery": query,
@@ -57,9 +143,9 @@ def get_google_search_places(api_key, query, max_results=100):
         if next_page_token:
             data["pageToken"] = next_page_token
 
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        response = request_with_retry(session, 'POST', url, bucket, headers=headers, json=data)
 
-        if response.status_code == 200:
+        if response is not None and response.status_code == 200:
             result = response.json()
             places = result.get('places', [])
             all_results.extend(places)
@@ -68,89 +154,113 @@ def get_google_search_places(api_key, query, max_results=100):
             if not next_page_token:
                 break
         else:
-            print(f"Error: {response.status_code}")
-            print(response.text)
+            print(f"Error: {getattr(response, 'status_code', 'connection failed')}")
+            print(getattr(response, 'text', ''))
             break
 
     return all_results[:max_results]
 
-def get_place_details(place_id, api_key):
+def get_place_details(place_id, api_key, session=None, bucket=None, max_retries=MAX_RETRIES):
     """Retrieve detailed information about a place, including reviews, from the Google Places API"""
-    url = (
-        "https://maps.googleapis.com/maps/api/place/details/json"
-        f"?place_id={place_id}&fields=reviews&key={api_key}"
-    )
-    response = requests.get(url, timeout=10)
-    if response.status_code == 200:
+    url = f"{MAPS_API_URL}/maps/api/place/details/json"
+    params = {'place_id': place_id, 'fields': 'reviews', 'key': api_key}
+    response = request_with_retry(session or create_session(), 'GET', url, bucket, max_retries,
+                                  params=params)
+    if response is not None and response.status_code == 200:
         return response.json().get('result', {})
 
-    print(f"Error: {response.status_code}")
+    print(f"Error for {place_id}: {getattr(response, 'status_code', 'connection failed')}")
     return None
 
+def crawl_place_details(place_ids, api_key, concurrency=CRAWL_CONCURRENCY, qps=CRAWL_QPS,
+                        max_retries=MAX_RETRIES):
+    """
+    Fetch the details of many places concurrently over one pooled session.
+    Yields (place_id, details) pairs in input order, details is None if the place failed.
+    """
+    session = create_session(concurrency)
+    bucket = TokenBucket(qps)
+    with session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        details = executor.map(lambda place_id: get_place_details(place_id, api_key, session,
+                                                                   bucket, max_retries),
+                               place_ids)
+        yield from zip(place_ids, details)
+
 def read_existing_results(filename):
-    """Read existing results from a JSON file."""
+    """Read existing results from a JSON Lines (or legacy JSON) dataset."""
     if os.path.exists(filename):
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return list(read_restaurants(filename))
     return []
 
-def write_results_to_file(path, results):
-    """Write results to a JSON file."""
-    with open(path, 'a', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=4)
-    print("Finished writing")
+def restaurant_record(place, details):
+    """Build the restaurant entry used by ingestion from a search result and its details."""
+    return {
+        "place_id": place['id'],
+        "name": place['displayName']['text'],
+        "keywords": place['types'],
+        "address": place.get('formattedAddress', 'Unknown'),
+        "rating": place.get('rating', 'Unknown'),
+        "price_level": place.get('priceLevel', 'Unknown'),
+        "num_of_reviews": place.get("userRatingCount", 'Unknown'),
+        "latitude": place.get('location', {}).get('latitude'),
+        "longitude": place.get('location', {}).get('longitude'),
+        "reviews": [review['text'] for review in details.get('reviews', [])]
+    }
 
-def create_restaurants():
-    """Create a list of restaurants in specific cities and save to a file."""
+def create_restaurants(state_path=CRAWL_STATE_PATH, refresh=False, max_age=QUERY_MAX_AGE):
+    """
+    Search restaurants in specific cities and record them in the crawl state. Searches
+    completed less than `max_age` seconds ago are skipped, none are with `refresh`.
+    """
     api_key = get_google_places_key()
     cities = ['Arcadia, CA', 'Little Tokyo in Los Angeles', 'Koreatown in Los Angeles',
               'Irvine, CA', 'West Hollywood, CA', 'Santa Monica, CA', 'Beverly Hills, CA']
 
+    state = CrawlState(state_path)
+    session, bucket = create_session(), TokenBucket(CRAWL_QPS)
     for city in cities:
-        restaurants = []
         query = f"Restaurants in {city}"
-        restaurants.append(get_google_search_places(api_key, query, 60))
-        write_results_to_file('test_data/medium-meh/restaurants.json', restaurants)
+        if not refresh and state.query_done(query, max_age):
+            print(f"Skipping '{query}', searched recently")
+            continue
+        places = get_google_search_places(api_key, query, 60, session, bucket)
+        counts = state.add_places(query, places)
+        print(f"'{query}': {len(places)} places, {counts['new']} new, "
+              f"{counts['changed']} changed, {counts['duplicate']} duplicates")
+    state.close()
 
-def create_restaurants_with_reviews():
-    """Create a detailed list of restaurants with reviews and save to a file."""
+def create_restaurants_with_reviews(concurrency=CRAWL_CONCURRENCY, qps=CRAWL_QPS,
+                                    state_path=CRAWL_STATE_PATH, output_path=RESTAURANTS_PATH):
+    """
+    Fetch the reviews of every place not fetched yet and export all fetched restaurants
+    as JSON Lines. Safe to interrupt, the next run resumes with the places still missing.
+    """
     api_key = get_google_places_key()
-    res, count = [], 0
-    json_restaurants = read_existing_results('test_data/medium-meh/restaurants.json')
-    print(len(json_restaurants))
-    for restaurant in json_restaurants:
-        restaurant_details = get_place_details(restaurant['id'], api_key)
-        reviews = [review['text'] for review in restaurant_details.get('reviews', [])]
-
-        restaurant_data = {
-            "place_id": restaurant['id'],
-            "name": restaurant['displayName']['text'],
-            "keywords": restaurant['types'],
-            "address": restaurant.get('formattedAddress', 'Unknown'),
-            "rating": restaurant.get('rating', 'Unknown'),
-            "price_level": restaurant.get('priceLevel', 'Unknown'),
-            "num_of_reviews": restaurant.get("userRatingCount", 'Unknown'),
-            "reviews": reviews
-        }
-
-        res.append(restaurant_data)
-        count += 1
-
-        # Handle large batches
-        if count % 60 == 0:
-            print(f"{count // 60} batch done.")
-            # Write JSON structure to a JSON file
-            path = 'test_data/medium-meh/restaurants_with_reviews.json'
-            with open(path, 'a', encoding='utf-8') as file:
-                json.dump(res, file, indent=4)
-            res = []
-            time.sleep(2)
-
-    with open('test_data/medium-meh/restaurants_with_reviews.json', 'a', encoding='utf-8') as file:
-        json.dump(res, file, indent=4)
-
-    print("Restaurants with reviews have been written to restaurants_with_reviews.json")
+    state = CrawlState(state_path)
+
+    # Seed the state from a search made before crawl states existed
+    if not state.counts() and os.path.exists(LEGACY_RESTAURANTS_PATH):
+        state.add_places(f'import:{LEGACY_RESTAURANTS_PATH}',
+                         read_existing_results(LEGACY_RESTAURANTS_PATH))
+
+    places = state.to_fetch()
+    print(f"{len(places)} places to fetch, {state.counts().get(FETCHED, 0)} already fetched")
+    details = crawl_place_details([place['id'] for place in places], api_key, concurrency, qps)
+    for place, (place_id, place_details) in zip(places, details):
+        if place_details is None:
+            state.mark_failed(place_id)
+        else:
+            state.mark_fetched(place_id, restaurant_record(place, place_details))
+
+    print(f"Crawl state: {state.counts()}")
+    count = state.export(output_path)
+    state.close()
+    print(f"{count} restaurants with reviews have been written to {output_path}")
 
 if __name__ == "__main__":
-    json_restaurants_w_reviews = read_existing_results('test_data/medium-meh/restaurants.json')
-    print(len(json_restaurants_w_reviews))
+    parser = argparse.ArgumentParser(description='Crawl restaurants and their reviews.')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Run every search again, however recently it completed.')
+    args = parser.parse_args()
+    create_restaurants(refresh=args.refresh)
+    create_restaurants_with_reviews()
@@ -0,0 +1,255 @@
+# pylint: disable=[E0401, W0718, C0301, R0914]
+
+"""
+This module benchmarks retrieval quality and latency for every vector store backend.
+
+A fixed query set is run against each backend, reporting recall@k, MRR and p50/p95/p99
+retrieval latency for dense and hybrid (BM25 + dense) search, plus the ingestion throughput
+of split_documents_and_add_to_collection and, with --summarize, documents_init.
+
+By default the benchmark runs offline: documents are built from the raw reviews instead of
+LLM summaries and embedded with a deterministic hashing model, so numbers are comparable
+between runs and machines. --openai uses the cached OpenAI embeddings instead.
+
+Queries come from a JSON file of {"query": str, "relevant": [place_id, ...]} entries, by
+default the hand-labelled set checked in next to the dataset. Queries describe what people
+ask for (dishes, cuisines, neighborhoods, price) rather than restaurant names, which would
+favor lexical search. With --generate-queries they are generated from the dataset instead,
+"<cuisine> in <city>" for every cuisine and city pair, for datasets without a labelled set.
+
+Example:
+    python langchain-testing/src/benchmark.py --backends numpy,chroma --k 5
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+import chromadb
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+from utils.dataset import read_restaurants
+from utils.helpers import (documents_init, embeddings_init, format_restaurant_data, pinecone_init,
+                           split_documents_and_add_to_collection, summary_inputs)
+from utils.lexical_index import BM25Index, hybrid_search, tokenize
+from utils.numpy_store import NumpyVectorStore
+from utils.query_filters import parse_query_filters
+
+DATASET_PATH = 'langchain-testing/test_data/medium-meh/restaurants_with_reviews.jsonl'
+QUERIES_PATH = 'langchain-testing/test_data/medium-meh/benchmark_queries.json'
+
+# Google Places types every restaurant has, useless as a cuisine
+GENERIC_KEYWORDS = {'restaurant', 'food', 'point_of_interest', 'establishment', 'store', 'bar'}
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings: word unigrams and bigrams hashed into a fixed number
+    of signed buckets, L2-normalized. Texts sharing words end up close to each other.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        """
+        Args:
+            dimensions (int): The number of hash buckets, i.e. the embedding size.
+        """
+        self.dimensions = dimensions
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a text by hashing its words and word pairs.
+        """
+        tokens = tokenize(text)
+        vector = [0.0] * self.dimensions
+        for feature in tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]:
+            digest = hashlib.md5(feature.encode('utf-8')).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds every text with embed_query.
+        """
+        return [self.embed_query(text) for text in texts]
+
+def offline_documents(restaurants: List[Dict]) -> List[str]:
+    """
+    Builds documents from the raw reviews, price and keywords, standing in for LLM summaries.
+    """
+    documents = []
+    for restaurant in restaurants:
+        inputs = summary_inputs(restaurant)
+        documents.append(f"{inputs['keywords']}\nPrice: {inputs['price']}\n{inputs['reviews']}")
+    return documents
+
+def generate_queries(meta: List[Dict]) -> List[Dict]:
+    """
+    Generates a labelled query set from restaurant metadata: a "<cuisine> in <city>" query
+    for every cuisine and city pair.
+    """
+    by_cuisine_city = defaultdict(list)
+    for m in meta:
+        for keyword in m['keywords'].split(', '):
+            if keyword and keyword not in GENERIC_KEYWORDS and m['city']:
+                by_cuisine_city[(keyword.replace('_', ' '), m['city'])].append(m['place_id'])
+    return [{'query': f'{cuisine} in {city}', 'relevant': ids}
+            for (cuisine, city), ids in sorted(by_cuisine_city.items())]
+
+def recall_at_k(retrieved: List[str], relevant: List[str], k: int) -> float:
+    """
+    Returns the share of relevant documents found in the top k.
+    """
+    return len(set(retrieved[:k]) & set(relevant)) / len(relevant) if relevant else 0.0
+
+def reciprocal_rank(retrieved: List[str], relevant: List[str]) -> float:
+    """
+    Returns 1 / rank of the first relevant document, 0 if none was retrieved.
+    """
+    for rank, doc_id in enumerate(retrieved, start=1):
+        if doc_id in relevant:
+            return 1 / rank
+    return 0.0
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Returns the q-th percentile of the values, using the nearest-rank method.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def build_store(backend: str, embedding: Embeddings, directory: str,
+                pinecone_index: Optional[str]) -> Optional[object]:
+    """
+    Builds an empty vector store of the given backend, None if it cannot run in this mode.
+    """
+    if backend == 'numpy':
+        return NumpyVectorStore(os.path.join(directory, 'numpy_store'), embedding)
+    if backend == 'chroma':
+        client = chromadb.EphemeralClient()
+        name = f'benchmark_{os.path.basename(directory)}'
+        client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+        return Chroma(client=client, collection_name=name, embedding_function=embedding)
+    if backend == 'pinecone' and pinecone_index:
+        return pinecone_init(pinecone_index)
+    return None
+
+def run_queries(store: object, index: Optional[BM25Index], queries: List[Dict],
+                cities: List[str], k: int, candidates: int, repeat: int) -> Dict[str, float]:
+    """
+    Runs every query `repeat` times and returns the quality and latency metrics.
+    The first run of every query is a warm-up and is not timed.
+    """
+    latencies, recalls, reciprocal_ranks = [], [], []
+    for entry in queries:
+        retrieved = []
+        for attempt in range(repeat + 1):
+            start = time.perf_counter()
+            embedding = store.embeddings.embed_query(entry['query'])
+            docs = hybrid_search(store, index, entry['query'], embedding, k=k,
+                                 candidates=candidates,
+                                 where=parse_query_filters(entry['query'], cities))
+            if attempt:
+                latencies.append((time.perf_counter() - start) * 1000)
+            retrieved = [doc.metadata['place_id'] for doc in docs]
+        recalls.append(recall_at_k(retrieved, entry['relevant'], k))
+        reciprocal_ranks.append(reciprocal_rank(retrieved, entry['relevant']))
+    return {
+        f'recall@{k}': sum(recalls) / len(recalls),
+        'mrr': sum(reciprocal_ranks) / len(reciprocal_ranks),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+def main():
+    """
+    Parses the command line, runs the benchmark for every backend and prints the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--data', default=DATASET_PATH,
+                        help='Restaurant dataset (JSON Lines or JSON).')
+    parser.add_argument('--queries', default=QUERIES_PATH, help='Labelled queries (JSON).')
+    parser.add_argument('--generate-queries', action='store_true',
+                        help='Generate the queries from the dataset instead of --queries.')
+    parser.add_argument('--backends', default='numpy,chroma',
+                        help='Comma-separated backends: numpy, chroma, pinecone.')
+    parser.add_argument('--k', type=int, default=5, help='Number of documents retrieved.')
+    parser.add_argument('--candidates', type=int, default=20,
+                        help='Candidates taken from each search before fusion.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs of every query.')
+    parser.add_argument('--openai', action='store_true',
+                        help='Use the cached OpenAI embeddings instead of the offline model.')
+    parser.add_argument('--summarize', action='store_true',
+                        help='Summarize reviews with documents_init and time it (needs OpenAI).')
+    parser.add_argument('--pinecone-index', help='Dedicated Pinecone index, needs --openai.')
+    parser.add_argument('--output', help='Also write the results to this JSON file.')
+    args = parser.parse_args()
+
+    # Documents and metadata
+    results = {'ingestion': {}, 'retrieval': {}}
+    if args.summarize:
+        start = time.perf_counter()
+        docs, restaurants = documents_init(args.data, cache_path=None)
+        elapsed = time.perf_counter() - start
+        results['ingestion']['documents_init_per_s'] = len(docs) / elapsed
+    else:
+        restaurants = list(read_restaurants(args.data))
+        docs = offline_documents(restaurants)
+    meta = format_restaurant_data(restaurants)
+    cities = sorted({m['city'] for m in meta if m['city']})
+
+    if args.generate_queries:
+        queries = generate_queries(meta)
+    else:
+        with open(args.queries, 'r', encoding='utf-8') as file:
+            queries = json.load(file)
+    print(f'{len(docs)} documents, {len(queries)} queries')
+
+    embedding = embeddings_init() if args.openai else HashingEmbeddings()
+    for backend in args.backends.split(','):
+        directory = tempfile.mkdtemp(prefix='munch_benchmark_')
+        try:
+            store = build_store(backend, embedding, directory,
+                                args.pinecone_index if args.openai else None)
+            if store is None:
+                print(f'Skipping {backend}: needs --openai and --pinecone-index')
+                continue
+
+            index_path = os.path.join(directory, 'lexical_index.json')
+            start = time.perf_counter()
+            split_documents_and_add_to_collection(docs, meta, store, checkpoint_path=None,
+                                                  lexical_index_path=index_path,
+                                                  geo_index_path=None)
+            results['ingestion'][f'{backend}_docs_per_s'] = \
+                len(docs) / (time.perf_counter() - start)
+
+            # Pinecone has no `get`, so it cannot fetch lexical-only hits
+            modes = {'dense': None}
+            if backend != 'pinecone':
+                modes['hybrid'] = BM25Index.load(index_path)
+            for mode, index in modes.items():
+                results['retrieval'][f'{backend}/{mode}'] = run_queries(
+                    store, index, queries, cities, args.k, args.candidates, args.repeat
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    for name, rate in results['ingestion'].items():
+        print(f'{name:<28} {rate:10.1f}')
+    for name, metrics in results['retrieval'].items():
+        print(f'{name:<28} ' + '  '.join(f'{key} {value:.3f}' for key, value in metrics.items()))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
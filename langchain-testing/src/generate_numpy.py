@@ -0,0 +1,39 @@
+# pylint: disable=[E0401, W0718, C0301, R0914]
+
+"""
+This module generates a vector database of restaurant information using the in-process NumPy store.
+It processes restaurant data, summarizes reviews, and stores the information in a vector database.
+"""
+
+from utils.dataset import read_restaurants
+from utils.helpers import documents_init, numpy_store_init, format_restaurant_data, split_documents_and_add_to_collection
+
+def main():
+    """
+    Main function to generate and store restaurant information in a vector database.
+    
+    Steps:
+    1. Creates summarized documents for vector storage along with their metadata.
+    2. Initializes the NumPy vector store.
+    3. Adds the summarized documents and metadata to the NumPy vector store.
+    """
+    # Creating documents for vector store + metadata
+    dataset_path = 'langchain-testing/test_data/medium-meh/restaurants_with_reviews.jsonl'
+    summarized_docs, restaurants_data = documents_init(dataset_path)
+    formatted_metadata = format_restaurant_data(restaurants_data)
+
+    # Initialize the store
+    numpy_store = numpy_store_init()
+
+    # Add data to the database, dropping documents of restaurants no longer in the dataset
+    # (and copies stored under older random IDs) but not those whose summary failed this run
+    split_documents_and_add_to_collection(
+        summarized_docs, formatted_metadata, numpy_store, prune=True,
+        keep_ids=(restaurant['place_id'] for restaurant in read_restaurants(dataset_path))
+    )
+
+    print('Data is now in DB')
+
+
+if __name__ == "__main__":
+    main()
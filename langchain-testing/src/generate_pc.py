@@ -5,6 +5,7 @@ This module generates a vector database of restaurant information using Pinecone
 It processes restaurant data, summarizes reviews, and stores the information in a vector database.
 """
 
+from utils.dataset import read_restaurants
 from utils.helpers import documents_init, pinecone_init, format_restaurant_data, split_documents_and_add_to_collection
 
 def main():
@@ -17,16 +18,19 @@ def main():
     3. Adds the summarized documents and metadata to the Pinecone collection.
     """
     # Creating documents for vector store + metadata
-    summarized_docs, restaurants_data = documents_init(
-        'langchain-testing/test_data/medium-meh/restaurants_with_reviews.json'
-    )
+    dataset_path = 'langchain-testing/test_data/medium-meh/restaurants_with_reviews.jsonl'
+    summarized_docs, restaurants_data = documents_init(dataset_path)
     formatted_metadata = format_restaurant_data(restaurants_data)
 
     # Initialize client and collection
     pinecone = pinecone_init("restaurant-info-medium-testing")
 
-    # Add data to the database
-    split_documents_and_add_to_collection(summarized_docs, formatted_metadata, pinecone)
+    # Add data to the database, dropping documents of restaurants no longer in the dataset
+    # (and copies stored under older random IDs) but not those whose summary failed this run
+    split_documents_and_add_to_collection(
+        summarized_docs, formatted_metadata, pinecone, prune=True,
+        keep_ids=(restaurant['place_id'] for restaurant in read_restaurants(dataset_path))
+    )
 
     print('Data is now in DB')
 
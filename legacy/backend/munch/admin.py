@@ -2,11 +2,15 @@
 # pylint: disable=E0401
 # pylint: disable=W0718
 from django.contrib import admin
-from .models import Message
+from .models import ChatSession, Message
 
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('user_id', 'session_id', 'message_type', 'timestamp', 'content')
 
+class ChatSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user_id', 'title', 'created_at', 'last_activity', 'message_count')
+
 # Register the Message model with the Django admin site.
 # This allows you to view and manage Message objects through the Django admin interface.
-admin.site.register(Message, MessageAdmin)
\ No newline at end of file
+admin.site.register(Message, MessageAdmin)
+admin.site.register(ChatSession, ChatSessionAdmin)
\ No newline at end of file
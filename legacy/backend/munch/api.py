@@ -2,23 +2,127 @@
 # pylint: disable=W0718
 
 """This module contains all the endpoints for the app"""
-import os
-from django.http import JsonResponse, HttpResponseBadRequest
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.core.exceptions import ValidationError
-from langchain_core.messages import HumanMessage
-from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage
 from ninja import NinjaAPI
-from utils.helpers import chromadb_init, format_docs, generate_prompt
-from .custom_chat_history import CustomChatMessageHistory, get_sessions, get_next_available_session
-from .schema import MessageRequest, FindSessionIDsRequest, GetConversation
+from utils.lexical_index import hybrid_search
+from utils.query_filters import (combine_filters, is_follow_up, parse_query_filters,
+                                 parse_query_location)
+from .clients import (RETRIEVER_K, get_chain, get_geo_index, get_known_cities, get_lexical_index,
+                      get_llm, get_semantic_cache, get_vector_store)
+from .custom_chat_history import (CustomChatMessageHistory, build_prompt_message, check_spam,
+                                  get_sessions, get_next_available_session)
+from .schema import MessageRequest, FindSessionIDsRequest, GetConversation, GetUserSessions
 
 # Create an instance of NinjaAPI for routing and request handling
 api = NinjaAPI()
 
-# Retrieve the OpenAI API key from environment variables
-OPEN_AI_API_KEY = os.getenv('OPENAI_API_KEY')
+def sse_event(event, data):
+    """
+    Formats a single Server-Sent Event.
+
+    Args:
+        event (str): The event name.
+        data (dict): The JSON-serializable event payload.
+
+    Returns:
+        str: The encoded event, terminated by a blank line.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def user_location(user_query):
+    """
+    Returns the location sent with a request.
+
+    Args:
+        user_query (MessageRequest): The data payload.
+
+    Returns:
+        Optional[Tuple[float, float]]: The user's (latitude, longitude), None if not sent.
+    """
+    if user_query.latitude is None or user_query.longitude is None:
+        return None
+    return user_query.latitude, user_query.longitude
+
+def retrieve(user_message, location=None):
+    """
+    Embeds the user message once and retrieves its documents with hybrid BM25 and vector
+    search, restricted to the price, city and rating filters found in the message and, for
+    location queries, to the restaurants within the radius, so nothing is retrieved when no
+    restaurant is nearby. Filters only apply to standalone searches: follow-up questions
+    about earlier recommendations ("is it expensive?") are retrieved unfiltered. Served
+    from the semantic cache when a near-duplicate query with the same filters was seen
+    recently.
+
+    Args:
+        user_message (str): The raw user query.
+        location (Optional[Tuple[float, float]]): The user's (latitude, longitude).
+
+    Returns:
+        Tuple[List[float], Optional[Dict], List[Document], Optional[SemanticCacheEntry]]:
+        The query embedding, the metadata filters, the retrieved documents and the
+        semantic cache entry on a hit.
+    """
+    vector_store = get_vector_store()
+    embedding = vector_store.embeddings.embed_query(user_message)
+    standalone = not is_follow_up(user_message)
+    filters = parse_query_filters(user_message, get_known_cities()) if standalone else None
+
+    # Prefilter location queries to the restaurants within the radius
+    geo_index = get_geo_index()
+    if geo_index and standalone:
+        radius = getattr(settings, 'GEO_SEARCH', {}).get('DEFAULT_RADIUS_KM', 2.0)
+        near = parse_query_location(user_message, location, radius)
+        if near:
+            place_ids = geo_index.within(*near)
+            filters = combine_filters(filters, {'place_id': {'$in': place_ids}})
+            if not place_ids:
+                # Nothing nearby, rather than answering with restaurants outside the radius
+                return embedding, filters, [], None
+
+    cache = get_semantic_cache()
+    hit = cache.lookup(embedding, filters) if cache else None
+    if hit:
+        docs = hit.docs
+    else:
+        candidates = getattr(settings, 'HYBRID_SEARCH', {}).get('CANDIDATES', 20)
+        docs = hybrid_search(vector_store, get_lexical_index(), user_message, embedding,
+                             k=RETRIEVER_K, candidates=candidates, where=filters)
+    return embedding, filters, docs, hit
+
+def remember(embedding, filters, docs, hit, answer=None):
+    """
+    Stores a query in the semantic cache unless it is already cached with everything it has.
+
+    Args:
+        embedding (List[float]): The query embedding.
+        filters (Optional[Dict]): The metadata filters the documents were retrieved with.
+        docs (List[Document]): The documents retrieved for the query.
+        hit (Optional[SemanticCacheEntry]): The semantic cache entry the query matched.
+        answer (Optional[str]): The answer, only given for the first turn of a session.
+    """
+    cache = get_semantic_cache()
+    if cache and (hit is None or (answer and not hit.answer)):
+        cache.store(embedding, docs, answer, filters)
+
+def is_new_session(chat_history):
+    """
+    Checks whether a session has no past turns, so a cached first-turn answer fits it.
+    Decided from the rows stored for the session, not from the replayed messages, which
+    the history policy may have trimmed or summarized.
+
+    Args:
+        chat_history (CustomChatMessageHistory): The loaded session history.
+
+    Returns:
+        bool: True if no turn was stored for the session before this request.
+    """
+    return chat_history.stored_turns == 0
 
 @api.post('/message')
 def message(request, user_query: MessageRequest):
@@ -43,49 +147,37 @@ def message(request, user_query: MessageRequest):
     user_message = user_query.user_message
     session_id = user_query.session_id
 
-    # Custom function to manage chat history based on session ID
-    def get_session_history(session_id: str) -> BaseChatMessageHistory:
-        """
-        Retrieve or create a CustomChatMessageHistory instance for the given session ID.
-
-        Args:
-            session_id (str): The ID of the session.
-
-        Returns:
-            BaseChatMessageHistory: The session history object.
-        """
-        return CustomChatMessageHistory(session_id, user_id=user_id)
-
     try: 
         # Configure the session
-        conf = {'configurable': {'session_id': session_id}}
+        conf = {'configurable': {'session_id': session_id, 'user_id': user_id}}
 
-        # Initialize the ChromaDB client
-        langchain_chroma = chromadb_init(OPEN_AI_API_KEY)
-        retriever = langchain_chroma.as_retriever(search_kwargs={"k": 5})
-
-        # Initialize the LLM (Large Language Model) for response generation
-        llm = ChatOpenAI(api_key=OPEN_AI_API_KEY, model="gpt-4o-mini")
-        with_message_history = RunnableWithMessageHistory(llm, get_session_history)
+        # Reuse the process-wide history-aware LLM
+        with_message_history = get_chain()
 
         # # Create an instance of CustomChatMessageHistory
         chat_history = CustomChatMessageHistory(session_id=session_id, user_id=user_id)
+        new_session = is_new_session(chat_history)
 
         # # Add the message to the chat history
         chat_history.add_message(user_message)
 
 
-        # Retrieve and format context from the retriever
-        context = format_docs(retriever.invoke(user_message))
+        # Generate the prompt based on the retrieved context and user message
+        embedding, filters, docs, hit = retrieve(user_message, user_location(user_query))
+        prompt = build_prompt_message(docs, user_message)
 
-        # Generate the prompt based on the context and user message
-        prompt = generate_prompt(context, user_message)
+        # Answer the first turn of a session from the semantic cache when possible
+        if new_session and hit and hit.answer:
+            chat_history.add_message(prompt)
+            chat_history.add_message(AIMessage(content=hit.answer))
+            return JsonResponse({'message_type': 'aimessage', 'content': hit.answer})
 
         # Get the response from the LLM using the prompt and session history
         response = with_message_history.invoke(
-            [HumanMessage(content=prompt)],
+            [prompt],
             config=conf
         )
+        remember(embedding, filters, docs, hit, response.content if new_session else None)
 
         # print(chat_history.get_conversation_by_session())
         # Return the response in JSON format
@@ -99,20 +191,148 @@ def message(request, user_query: MessageRequest):
         return JsonResponse({'error': 'An unexpected error occurred.'}, status=500)
     
 
+@api.post('/amessage')
+async def amessage(request, user_query: MessageRequest):
+    """
+    Async variant of /message for ASGI deployments.
+
+    The retriever lookup, the session history load and the spam check run concurrently,
+    then the LLM call is awaited, so the worker is free while OpenAI responds.
+
+    Args:
+        request: The HTTP request object.
+        user_query (MessageRequest): The data payload containing user message and session ID.
+
+    Returns:
+        JsonResponse: JSON response with the system's reply or error message.
+    """
+    user_id = user_query.user_id
+    user_message = user_query.user_message
+    session_id = user_query.session_id
+
+    try:
+        # Retrieval, history load and spam check do not depend on each other
+        (embedding, filters, docs, hit), chat_history, _ = await asyncio.gather(
+            sync_to_async(retrieve, thread_sensitive=False)(user_message,
+                                                             user_location(user_query)),
+            sync_to_async(CustomChatMessageHistory)(session_id=session_id, user_id=user_id),
+            sync_to_async(check_spam)(session_id, user_id),
+        )
+
+        # The spam check already ran, so write straight to the database
+        await sync_to_async(chat_history.save_message_to_db)(user_message)
+
+        # Generate the prompt based on the context and user message
+        prompt = build_prompt_message(docs, user_message)
+        new_session = is_new_session(chat_history)
+
+        # Answer the first turn of a session from the semantic cache when possible,
+        # otherwise get the response from the LLM using the loaded history and the new prompt
+        if new_session and hit and hit.answer:
+            response = AIMessage(content=hit.answer)
+        else:
+            response = await get_llm().ainvoke(chat_history.messages + [prompt])
+            remember(embedding, filters, docs, hit, response.content if new_session else None)
+
+        # Persist the turn the same way RunnableWithMessageHistory does
+        await sync_to_async(chat_history.save_message_to_db)(prompt)
+        await sync_to_async(chat_history.save_message_to_db)(response)
+
+        return JsonResponse({'message_type': 'aimessage', 'content': response.content})
+
+    except ValidationError as e:
+        # Handle the ValidationError (e.g., too many messages in a short period)
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception:
+        # Handle any other unexpected exceptions
+        return JsonResponse({'error': 'An unexpected error occurred.'}, status=500)
+
+@api.post('/message_stream')
+async def message_stream(request, user_query: MessageRequest):
+    """
+    Handle an incoming message and stream the reply token by token over Server-Sent Events.
+
+    Emits a `token` event for every chunk produced by the LLM and a final `aimessage` event
+    with the full reply. The prompt and the reply are saved to the session history once
+    the stream completes. The stream is an async generator, so ASGI servers send every
+    token as soon as it arrives instead of buffering the whole reply.
+
+    Args:
+        request: The HTTP request object.
+        user_query (MessageRequest): The data payload containing user message and session ID.
+
+    Returns:
+        StreamingHttpResponse: `text/event-stream` response, or a JsonResponse on error.
+    """
+    user_id = user_query.user_id
+    user_message = user_query.user_message
+    session_id = user_query.session_id
+
+    try:
+        chat_history = await sync_to_async(CustomChatMessageHistory)(session_id=session_id,
+                                                                      user_id=user_id)
+        new_session = is_new_session(chat_history)
+        await sync_to_async(chat_history.add_message)(user_message)
+
+        # Generate the prompt based on the retrieved context and user message
+        embedding, filters, docs, hit = await sync_to_async(retrieve, thread_sensitive=False)(
+            user_message, user_location(user_query)
+        )
+        prompt = build_prompt_message(docs, user_message)
+        history = chat_history.messages + [prompt]
+
+    except ValidationError as e:
+        # Handle the ValidationError (e.g., too many messages in a short period)
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception:
+        # Handle any other unexpected exceptions
+        return JsonResponse({'error': 'An unexpected error occurred.'}, status=500)
+
+    async def event_stream():
+        """Yields LLM tokens as SSE events and saves the turn once the stream completes."""
+        content = ""
+        try:
+            if new_session and hit and hit.answer:
+                # Answer the first turn of a session from the semantic cache
+                content = hit.answer
+                yield sse_event('token', {'content': content})
+            else:
+                async for chunk in get_llm().astream(history):
+                    if chunk.content:
+                        content += chunk.content
+                        yield sse_event('token', {'content': chunk.content})
+                await sync_to_async(remember)(embedding, filters, docs, hit,
+                                              content if new_session else None)
+
+            await sync_to_async(chat_history.add_message)(prompt)
+            await sync_to_async(chat_history.add_message)(AIMessage(content=content))
+            yield sse_event('aimessage', {'message_type': 'aimessage', 'content': content})
+        except Exception:
+            yield sse_event('error', {'error': 'An unexpected error occurred.'})
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api.post('/get_user_sessions')
-def get_user_sessions(request, payload: FindSessionIDsRequest):
+def get_user_sessions(request, payload: GetUserSessions):
     """
-    Handle an incoming request to retrieve all session IDs for a given user.
+    Handle an incoming request to retrieve a page of session IDs for a given user.
 
     Args:
         request: The HTTP request object.
-        payload (FindSessionIDsRequest): An object containing the user ID.
+        payload (GetUserSessions): An object containing the user ID and the page to return.
 
     Returns:
-        JsonResponse: JSON response with the list of session IDs or an error message.
+        JsonResponse: JSON response with the session IDs, most recently active first,
+        and their metadata.
     """
-    user_id = payload.user_id
-    return JsonResponse({'sessions': get_sessions(user_id=user_id)})
+    sessions = get_sessions(user_id=payload.user_id, offset=payload.offset, limit=payload.limit)
+    return JsonResponse({
+        'sessions': [session['session_id'] for session in sessions],
+        'session_details': sessions,
+    })
 
 @api.post('/get_conversation')
 def get_conversation(request, payload: GetConversation):
@@ -134,16 +354,15 @@ def get_conversation(request, payload: GetConversation):
 @api.post('/get_new_session')
 def get_new_session(request, payload: FindSessionIDsRequest):
     """
-    Handle an incoming request to retrieve all session IDs for a given user.
+    Handle an incoming request to allocate a new session ID for a given user.
 
     Args:
         request: The HTTP request object.
         payload (FindSessionIDsRequest): An object containing the user ID.
 
     Returns:
-        JsonResponse: JSON response with the list of session IDs or an error message.
+        JsonResponse: JSON response with the new session ID.
     """
     user_id = payload.user_id
-    new_session = get_next_available_session()
-    CustomChatMessageHistory(user_id=user_id, session_id=new_session)
+    new_session = get_next_available_session(user_id)
     return JsonResponse({'new_session': new_session})
\ No newline at end of file
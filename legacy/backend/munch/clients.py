@@ -0,0 +1,252 @@
+# pylint: disable=E0401
+# pylint: disable=W0718
+
+"""
+Process-wide registry for the clients used by the chat endpoints.
+
+Building the Chroma client, the embeddings model, the LLM and the history-aware
+runnable is expensive, so each one is created lazily on first use and then shared
+by every request and worker thread in the process.
+
+Functions:
+- get_vector_store: Returns the shared vector store selected by the VECTOR_STORE_BACKEND setting.
+- get_retriever: Returns the shared retriever built on top of the vector store.
+- get_llm: Returns the shared ChatOpenAI client.
+- get_chain: Returns the shared RunnableWithMessageHistory wrapping the LLM.
+- get_semantic_cache: Returns the shared semantic query cache, None when disabled.
+- get_lexical_index: Returns the shared BM25 index for hybrid retrieval, None when unavailable.
+- get_known_cities: Returns the cities present in the vector store, used to parse query filters.
+- get_geo_index: Returns the shared spatial index for radius queries, None when unavailable.
+- warm_up: Eagerly builds every client.
+- shutdown: Closes and drops every client. Registered with atexit.
+"""
+
+import atexit
+import os
+import threading
+from django.conf import settings
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.runnables import ConfigurableFieldSpec
+from langchain_core.runnables.history import RunnableWithMessageHistory
+from langchain_openai import ChatOpenAI
+from utils.geo_index import GeoIndex
+from utils.helpers import GEO_INDEX_PATH, LEXICAL_INDEX_PATH, chromadb_init, numpy_store_init
+from utils.lexical_index import BM25Index
+from .custom_chat_history import CustomChatMessageHistory
+from .semantic_cache import SemanticCache
+
+# Retrieve the OpenAI API key from environment variables
+OPEN_AI_API_KEY = os.getenv('OPENAI_API_KEY')
+
+# Number of documents returned by the retriever for every user query
+RETRIEVER_K = 5
+
+# Re-entrant, factories build their dependencies through the same registry
+_lock = threading.RLock()
+_clients = {}
+
+
+def _get_or_create(name, factory):
+    """
+    Returns the client registered under `name`, building it with `factory` on first use.
+
+    Uses double-checked locking so the fast path never takes the lock and concurrent
+    first callers only build the client once.
+
+    Args:
+        name (str): The registry key of the client.
+        factory (Callable[[], object]): Builds the client when it does not exist yet.
+
+    Returns:
+        object: The shared client.
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def get_session_history(user_id: str, session_id: str) -> BaseChatMessageHistory:
+    """
+    Retrieve or create a CustomChatMessageHistory instance for the given user and session.
+
+    Args:
+        user_id (str): The ID of the user.
+        session_id (str): The ID of the session.
+
+    Returns:
+        BaseChatMessageHistory: The session history object.
+    """
+    return CustomChatMessageHistory(session_id, user_id=user_id)
+
+
+def get_vector_store():
+    """
+    Returns the shared vector store, opening it on first use. The VECTOR_STORE_BACKEND
+    setting selects Chroma ('chroma') or the in-process NumPy store ('numpy').
+
+    Returns:
+        Union[Chroma, NumpyVectorStore]: The shared vector store.
+    """
+    backends = {'chroma': chromadb_init, 'numpy': numpy_store_init}
+    return _get_or_create('vector_store',
+                          backends[getattr(settings, 'VECTOR_STORE_BACKEND', 'chroma')])
+
+
+def get_retriever():
+    """
+    Returns the shared retriever over the vector store.
+
+    Returns:
+        VectorStoreRetriever: The shared retriever.
+    """
+    return _get_or_create(
+        'retriever',
+        lambda: get_vector_store().as_retriever(search_kwargs={"k": RETRIEVER_K})
+    )
+
+
+def get_llm():
+    """
+    Returns the shared LLM client used for response generation.
+
+    Returns:
+        ChatOpenAI: The shared LLM client.
+    """
+    return _get_or_create(
+        'llm',
+        lambda: ChatOpenAI(api_key=OPEN_AI_API_KEY, model="gpt-4o-mini")
+    )
+
+
+def get_chain():
+    """
+    Returns the shared LLM runnable wrapped with per-session message history.
+
+    The history is looked up from the `user_id` and `session_id` configurable fields,
+    so a single runnable can serve every user.
+
+    Returns:
+        RunnableWithMessageHistory: The shared history-aware runnable.
+    """
+    return _get_or_create(
+        'chain',
+        lambda: RunnableWithMessageHistory(
+            get_llm(),
+            get_session_history,
+            history_factory_config=[
+                ConfigurableFieldSpec(
+                    id="user_id",
+                    annotation=str,
+                    name="User ID",
+                    description="Unique identifier for the user.",
+                    default="",
+                    is_shared=True,
+                ),
+                ConfigurableFieldSpec(
+                    id="session_id",
+                    annotation=str,
+                    name="Session ID",
+                    description="Unique identifier for the chat session.",
+                    default="",
+                    is_shared=True,
+                ),
+            ],
+        )
+    )
+
+
+def get_semantic_cache():
+    """
+    Returns the shared semantic query cache configured by the SEMANTIC_CACHE setting.
+
+    Returns:
+        Optional[SemanticCache]: The shared cache, None when the cache is disabled.
+    """
+    config = getattr(settings, 'SEMANTIC_CACHE', {})
+    if not config.get('ENABLED', False):
+        return None
+    return _get_or_create(
+        'semantic_cache',
+        lambda: SemanticCache(threshold=config.get('THRESHOLD', 0.95),
+                              ttl=config.get('TTL', 3600),
+                              max_entries=config.get('MAX_ENTRIES', 1000))
+    )
+
+
+def get_lexical_index():
+    """
+    Returns the shared BM25 index configured by the HYBRID_SEARCH setting, loading it
+    from the file written by ingestion on first use.
+
+    Returns:
+        Optional[BM25Index]: The shared index, None when hybrid search is disabled or
+        the index has not been built.
+    """
+    config = getattr(settings, 'HYBRID_SEARCH', {})
+    path = config.get('INDEX_PATH', LEXICAL_INDEX_PATH)
+    if not config.get('ENABLED', False) or not os.path.exists(path):
+        return None
+    return _get_or_create('lexical_index', lambda: BM25Index.load(path))
+
+
+def get_known_cities():
+    """
+    Returns the cities present in the vector store metadata, read once on first use.
+
+    Returns:
+        FrozenSet[str]: The known cities, empty for stores indexed without a city.
+    """
+    def load():
+        metadatas = get_vector_store().get(include=['metadatas'])['metadatas']
+        return frozenset(m['city'] for m in metadatas if m.get('city'))
+    return _get_or_create('known_cities', load)
+
+
+def get_geo_index():
+    """
+    Returns the shared spatial index configured by the GEO_SEARCH setting, loading it
+    from the file written by ingestion on first use.
+
+    Returns:
+        Optional[GeoIndex]: The shared index, None when geo search is disabled or
+        the index has not been built.
+    """
+    config = getattr(settings, 'GEO_SEARCH', {})
+    path = config.get('INDEX_PATH', GEO_INDEX_PATH)
+    if not config.get('ENABLED', False) or not os.path.exists(path):
+        return None
+    return _get_or_create('geo_index', lambda: GeoIndex.load(path))
+
+
+def warm_up():
+    """
+    Eagerly builds every client so the first request does not pay for it.
+    """
+    get_retriever()
+    get_chain()
+    get_lexical_index()
+    get_known_cities()
+    get_geo_index()
+
+
+def shutdown():
+    """
+    Closes the underlying HTTP clients and drops every registered client.
+    The next call to any getter builds a fresh client.
+    """
+    with _lock:
+        http_client = getattr(_clients.get('llm'), 'root_client', None)
+        if http_client is not None:
+            try:
+                http_client.close()
+            except Exception as e:
+                print(f'Error closing LLM client: {e}')
+        _clients.clear()
+
+
+atexit.register(shutdown)
@@ -1,13 +1,20 @@
 # pylint: disable=E0401
 # pylint: disable=W0718
+# pylint: disable=C0415
 """Custom class for chats and message history"""
 
 import os
+from functools import lru_cache
 import django
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.chat_history import BaseChatMessageHistory
-from .models import Message
-from datetime import timedelta
+from langchain_core.documents import Document
+from utils.helpers import format_docs, generate_prompt, strip_prompt_context
+from .models import ChatSession, Message
+from .prompts import SESSION_PREAMBLE
+from .rate_limit import get_rate_limiter, rate_limit_keys
+from django.conf import settings
+from django.db.models import F
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
@@ -33,37 +40,31 @@ class CustomChatMessageHistory(BaseChatMessageHistory):
         self.session_id = session_id
         self.user_id = user_id
         self.messages = []
+        self.stored_turns = 0  # Past turns found in the database, before the history policy
         self.initialize_session()
 
     def check_spam(self):
         """
-        Checks if the user has sent more than 15 messages within the last 2 minutes.
+        Checks the user's message against the per-session and per-user rate limits.
 
         Raises:
             ValidationError: If the user has sent too many messages in the given timeframe.
         """
-        time_window_start = timezone.now() - timedelta(minutes=2)
-        recent_message_count = Message.objects.filter(
-            session_id=self.session_id,
-            user_id=self.user_id,
-            timestamp__gte=time_window_start
-        ).count()
-
-        if recent_message_count >= 25:
-            raise ValidationError("You have sent too many messages in a short period. Please wait before sending more.")
+        check_spam(self.session_id, self.user_id)
 
     def add_message(self, message):
         """
         Adds a message to the current session's message history and saves it to the database.
+        Raw user messages are checked against the rate limits, prompts and replies are not.
 
         Args:
-            message (Union[HumanMessage, AIMessage]): The message to add.
+            message (Union[str, HumanMessage, AIMessage]): The message to add.
 
         Raises:
             ValidationError: If the user has sent too many messages in the given timeframe.
         """
-        
-        self.check_spam()  # Check for spam before adding the message
+        if isinstance(message, str):
+            self.check_spam()  # Check for spam before adding the user's message
         if isinstance(message, (HumanMessage, AIMessage)):
             self.messages.append(message)
         self.save_message_to_db(message)
@@ -99,6 +100,15 @@ class CustomChatMessageHistory(BaseChatMessageHistory):
                 message_type="humanmessage_no_prompt",
                 content=message
             )
+        elif 'user_query' in message.additional_kwargs and not history_policy()['STORE_CONTEXT']:
+            # Store the raw query plus references, the prompt is rebuilt on load
+            Message.objects.create(
+                session_id=self.session_id,
+                user_id=self.user_id,
+                message_type=message.__class__.__name__.lower(),
+                content=message.additional_kwargs['user_query'],
+                place_ids=message.additional_kwargs.get('place_ids', [])
+            )
         else:
             Message.objects.create(
                 session_id=self.session_id,
@@ -106,18 +116,31 @@ class CustomChatMessageHistory(BaseChatMessageHistory):
                 message_type=message.__class__.__name__.lower(),
                 content=message.content
             )
+        touch_session(self.session_id, self.user_id, title=message if isinstance(message, str) else None)
 
     def load_messages_from_db(self):
         """
-        Loads all messages from the database for the current session ID and user ID and stores them in memory.
+        Loads the messages from the database for the current session ID and user ID and stores them in memory,
+        behind the shared SESSION_PREAMBLE. Past turns are bounded by the CHAT_HISTORY setting.
         """
         db_messages = Message.objects.filter(session_id=self.session_id, user_id=self.user_id).order_by('timestamp')
+        turns = []
+        first_non_prompt_human_message_seen = False
         for db_message in db_messages:
-            if db_message.message_type == 'humanmessage':
-                self.messages.append(HumanMessage(content=db_message.content))
-            elif db_message.message_type == 'aimessage':
-                self.messages.append(AIMessage(content=db_message.content))
-                
+            if db_message.message_type == 'humanmessage_no_prompt':
+                first_non_prompt_human_message_seen = True
+            elif not first_non_prompt_human_message_seen:
+                # Older sessions stored the preamble as rows, SESSION_PREAMBLE replaces them
+                continue
+            elif db_message.message_type == 'humanmessage':
+                additional_kwargs = {'place_ids': db_message.place_ids} if db_message.place_ids else {}
+                turns.append([HumanMessage(content=db_message.content, additional_kwargs=additional_kwargs)])
+            elif db_message.message_type == 'aimessage' and turns:
+                turns[-1].append(AIMessage(content=db_message.content))
+
+        self.stored_turns = len(turns)
+        self.messages.extend(SESSION_PREAMBLE)
+        self.messages.extend(apply_history_policy(turns))
 
     def clear_messages_from_db(self):
         """
@@ -127,50 +150,10 @@ class CustomChatMessageHistory(BaseChatMessageHistory):
 
     def initialize_session(self):
         """
-        Initializes the session by loading existing messages or setting up a new session with default messages.
-        """
-        if not Message.objects.filter(session_id=self.session_id, user_id=self.user_id).exists():
-            # Add initial setup messages if the session is new
-            initial_messages = [
-                HumanMessage(content="""
-                    You're a chatbot designed to assist users in finding restaurants in the Los Angeles area. When users interact with you, you'll receive a list of restaurant data, which may or may not relate to their queries. Your task is to match the user's input with the relevant restaurant information and provide helpful suggestions.
-
-                    If the user's input doesn't align with any restaurants in the list or conversation history, kindly steer the conversation towards helping them find a restaurant based on their desires. If the user's query is unrelated to restaurants or food, politely let them know you're focused on helping them with restaurant recommendations and gently guide the conversation back to dining.
-
-                    Keep in mind that the restaurant data you receive is just an aid—never mention it to the user. Think of it as part of your built-in knowledge. Now, you'll receive instructions on how to respond to users.
-                """),
-                AIMessage(content="Welcome to the restaurant chatbot! I'm here to help you find great places to eat in Los Angeles. How can I assist you today?"),
-                HumanMessage(content="""
-                    Guidelines:
-                        - Sort the restaurants based on their ratings, from highest to lowest, and recommend the top 3 that match the user's query.
-                        - If a restaurant doesn't offer the food the user desires, don't suggest it.
-                        - If the list of restaurants doesn't perfectly match the user's request, use your broader knowledge to provide alternative suggestions related to the user's preferences.
-                        - Act as a knowledgeable restaurant recommender after this message, without mentioning that you received any data. Assume you already had this information.
-                        - Maintain the conversational context: if the user's input is related to the current discussion, even if not directly about food or restaurants, continue the conversation naturally. Only pivot back to food/restaurants if the user's input is entirely unrelated to the ongoing context (e.g., "I want a computer to play games").
-                        - Politely inform the user if they ask about something unrelated to restaurants or food, and gently steer the conversation back to restaurant recommendations.
-                        - Don't use numbers to list the restaurants, just list them.
-                        - Use the format below when providing restaurant information, but only when explicitly asked about the restaurants:
-
-                        _____________________________________________
-
-                        **Restaurant Name**
-                        * Address: address_of_restaurant
-
-                        **What customers think about this restaurant:**
-                        * Summary of customer reviews
-                        * Popular foods (be specific)
-                        * Rating of the restaurant
-                        * Price point
-                        _____________________________________________
-                """),
-                AIMessage(content="Got it!")
-            ]
-            for message in initial_messages:
-                self.add_message(message)
-        else:
-            # Load existing session messages from the database
-            self.load_messages_from_db()
-
+        Initializes the session by loading existing messages behind the shared preamble.
+        New sessions hold no rows until their first real turn.
+        """
+        self.load_messages_from_db()
 
     def get_conversation(self):
         db_messages = Message.objects.filter(session_id=self.session_id, user_id=self.user_id).order_by('timestamp')
@@ -184,33 +167,225 @@ class CustomChatMessageHistory(BaseChatMessageHistory):
                 messages.append({'message_type': 'aimessage', 'content': db_message.content})
         return messages
 
-def get_sessions(user_id):
+# Maximum length of the session title taken from the first user message
+SESSION_TITLE_LENGTH = 100
+
+HISTORY_POLICY_DEFAULTS = {
+    'MAX_TURNS': None,
+    'MAX_TOKENS': None,
+    'SUMMARIZE': False,
+    'STRIP_CONTEXT': False,
+    'STORE_CONTEXT': True,
+}
+
+SUMMARY_TEMPLATE = """
+    Summarize the conversation below between a user and a restaurant recommendation chatbot in a few sentences.
+    Keep the user's preferences (cuisines, neighborhoods, budget, dietary needs) and the restaurants already recommended.
+
+    Previous summary:
+    {summary}
+
+    Conversation:
+    {transcript}
+"""
+
+def history_policy():
     """
-    Retrieves all unique session IDs that match the given user_id.
+    Returns the CHAT_HISTORY setting merged over the defaults.
+
+    Returns:
+        Dict: The chat history policy.
+    """
+    return {**HISTORY_POLICY_DEFAULTS, **getattr(settings, 'CHAT_HISTORY', {})}
+
+def build_prompt_message(docs, user_message):
+    """
+    Builds the retrieval-augmented HumanMessage sent to the LLM.
+    The raw query and the retrieved place_ids travel along so the history can store
+    references instead of the full prompt.
 
     Args:
-        user_id (str): The user ID to filter sessions by.
+        docs (List[Document]): The documents returned by the retriever.
+        user_message (str): The raw user query.
+
+    Returns:
+        HumanMessage: The prompt message.
+    """
+    return HumanMessage(
+        content=generate_prompt(format_docs(docs), user_message),
+        additional_kwargs={
+            'user_query': user_message,
+            'place_ids': [doc.metadata['place_id'] for doc in docs if 'place_id' in doc.metadata],
+        }
+    )
+
+def rebuild_prompt(user_message, place_ids):
+    """
+    Rebuilds the prompt of a past turn stored as a raw query plus place_id references.
+
+    Args:
+        user_message (str): The raw user query.
+        place_ids (List[str]): The place_ids retrieved for the query.
+
+    Returns:
+        str: The retrieval-augmented prompt.
+    """
+    from .clients import get_vector_store
+
+    found = get_vector_store().get(where={'place_id': {'$in': place_ids}})
+    by_place_id = {
+        meta['place_id']: Document(page_content=content, metadata=meta)
+        for content, meta in zip(found['documents'], found['metadatas'])
+    }
+    docs = [by_place_id[place_id] for place_id in place_ids if place_id in by_place_id]
+    return generate_prompt(format_docs(docs), user_message)
+
+def estimate_tokens(message):
+    """
+    Roughly estimates the number of tokens in a message, assuming about 4 characters per token.
+
+    Args:
+        message (BaseMessage): The message to measure.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return len(message.content) // 4 + 1
+
+@lru_cache(maxsize=256)
+def summarize_turns(turns, chunk_size):
+    """
+    Summarizes past turns in fixed-size chunks, reusing the summary of the earlier chunks.
+    Results are cached, so a session only pays for one LLM call every `chunk_size` turns.
+
+    Args:
+        turns (Tuple[Tuple[Tuple[str, str], ...], ...]): (role, content) pairs for every turn.
+        chunk_size (int): The number of turns summarized per LLM call.
 
     Returns:
-        List[str]: A list of unique session IDs associated with the user.
+        str: The summary of all the given turns.
     """
-    # Query the database for messages that match the user_id and get distinct session IDs
-    session_ids = set(Message.objects.filter(user_id=user_id).values_list('session_id', flat=True))
-    return list(session_ids)
+    from .clients import get_llm
+
+    previous = summarize_turns(turns[:-chunk_size], chunk_size) if len(turns) > chunk_size else 'None'
+    transcript = '\n'.join(f'{role}: {content}' for turn in turns[-chunk_size:] for role, content in turn)
+    return get_llm().invoke(SUMMARY_TEMPLATE.format(summary=previous, transcript=transcript)).content
 
-def get_next_available_session():
+def apply_history_policy(turns):
     """
-    Finds the first available session ID that is not used in the database.
+    Bounds the past turns replayed to the LLM according to the CHAT_HISTORY setting.
+
+    Args:
+        turns (List[List[BaseMessage]]): Past turns in order, each a prompt and its reply.
 
     Returns:
-        int: The first available session ID.
+        List[BaseMessage]: The messages to replay, optionally led by a summary of dropped turns.
     """
-    # Retrieve all existing session IDs
-    existing_session_ids = set(Message.objects.values_list('session_id', flat=True))
+    policy = history_policy()
+    max_turns, max_tokens = policy['MAX_TURNS'], policy['MAX_TOKENS']
+
+    if policy['STRIP_CONTEXT']:
+        turns = [[HumanMessage(content=strip_prompt_context(m.content)) if isinstance(m, HumanMessage) else m
+                  for m in turn] for turn in turns]
+
+    summary = None
+    if max_turns and len(turns) > max_turns:
+        if policy['SUMMARIZE']:
+            # Summarize whole chunks only, so the summary changes once every max_turns turns
+            cut = (len(turns) - max_turns) // max_turns * max_turns
+            if cut:
+                key = tuple(tuple((m.type, m.content) for m in turn) for turn in turns[:cut])
+                summary = summarize_turns(key, max_turns)
+        else:
+            cut = len(turns) - max_turns
+        turns = turns[cut:]
+
+    if not policy['STRIP_CONTEXT']:
+        # Turns stored as references get their context back, only for the turns kept
+        turns = [[HumanMessage(content=rebuild_prompt(m.content, m.additional_kwargs['place_ids']))
+                  if m.additional_kwargs.get('place_ids') else m for m in turn] for turn in turns]
+
+    if max_tokens:
+        # Keep the most recent turns that fit in the budget
+        budget, kept = max_tokens, []
+        for turn in reversed(turns):
+            budget -= sum(estimate_tokens(m) for m in turn)
+            if budget < 0:
+                break
+            kept.append(turn)
+        turns = kept[::-1]
+
+    messages = [SystemMessage(content=f"Summary of the earlier conversation: {summary}")] if summary else []
+    for turn in turns:
+        messages.extend(turn)
+    return messages
+
+def check_spam(session_id, user_id):
+    """
+    Checks a user message against the per-session and per-user rate limits and consumes
+    one token from each. Standalone so it can run without loading the session history.
+
+    Args:
+        session_id (str): The session ID to check.
+        user_id (str): The user ID to check.
 
-    # Start checking from 0 and continue until finding an available session ID
-    next_session_id = 0
-    while str(next_session_id) in existing_session_ids:
-        next_session_id += 1
+    Raises:
+        ValidationError: If the user has sent too many messages in the given timeframe.
+    """
+    if not get_rate_limiter().hit(rate_limit_keys(session_id, user_id)):
+        raise ValidationError("You have sent too many messages in a short period. Please wait before sending more.")
 
-    return str(next_session_id)
+def touch_session(session_id, user_id, title=None):
+    """
+    Updates the session metadata after a message is written: bumps the message count and
+    last activity, and sets the title from the first user message.
+
+    Args:
+        session_id (str): The session the message was written to.
+        user_id (str): The user who owns the session.
+        title (Optional[str]): The raw user message, used as the title if the session has none.
+    """
+    if not session_id.isdigit():
+        return
+    sessions = ChatSession.objects.filter(pk=int(session_id), user_id=user_id)
+    updated = sessions.update(last_activity=timezone.now(), message_count=F('message_count') + 1)
+    if not updated:
+        # Sessions that were not allocated through get_next_available_session
+        ChatSession.objects.get_or_create(pk=int(session_id),
+                                          defaults={'user_id': user_id, 'message_count': 1})
+    if title:
+        sessions.filter(title='').update(title=title[:SESSION_TITLE_LENGTH])
+
+def get_sessions(user_id, offset=0, limit=50):
+    """
+    Retrieves a page of the user's sessions, most recently active first.
+
+    Args:
+        user_id (str): The user ID to filter sessions by.
+        offset (int): The number of sessions to skip.
+        limit (int): The maximum number of sessions to return.
+
+    Returns:
+        List[Dict]: The sessions with their ID, title, creation time, last activity and message count.
+    """
+    sessions = ChatSession.objects.filter(user_id=user_id).order_by('-last_activity')
+    return [{
+        'session_id': str(session['id']),
+        'title': session['title'],
+        'created_at': session['created_at'],
+        'last_activity': session['last_activity'],
+        'message_count': session['message_count'],
+    } for session in sessions.values('id', 'title', 'created_at', 'last_activity',
+                                     'message_count')[offset:offset + limit]]
+
+def get_next_available_session(user_id):
+    """
+    Allocates a new session ID for the user.
+
+    Args:
+        user_id (str): The user ID that owns the new session.
+
+    Returns:
+        str: The new session ID.
+    """
+    return str(ChatSession.objects.create(user_id=user_id).pk)
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munch', '0003_message_user_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='place_ids',
+            field=models.JSONField(blank=True, default=list, help_text='place_ids of the restaurants retrieved for this message.'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munch', '0004_message_place_ids'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['session_id', 'user_id', 'timestamp'], name='message_session_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['user_id', 'session_id'], name='message_user_session_idx'),
+        ),
+    ]
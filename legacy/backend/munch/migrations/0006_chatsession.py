@@ -0,0 +1,62 @@
+# Generated by Django 5.1 on 2026-10-18 13:02
+
+from django.core.management.color import no_style
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def backfill_sessions(apps, schema_editor):
+    """
+    Creates a ChatSession for every numeric session ID already used by a Message,
+    so newly allocated IDs never collide with existing sessions.
+
+    Older session IDs were not unique per user. The user who wrote first keeps a shared
+    ID, the messages of every other user are moved to a newly allocated session.
+    """
+    ChatSession = apps.get_model('munch', 'ChatSession')
+    Message = apps.get_model('munch', 'Message')
+
+    owners, moved = {}, []
+    sessions = (Message.objects.values('session_id', 'user_id')
+                .annotate(first_message=Min('id')).order_by('first_message'))
+    for session in sessions:
+        if not session['session_id'].isdigit():
+            continue
+        if int(session['session_id']) in owners:
+            moved.append(session)
+        else:
+            owners[int(session['session_id'])] = session['user_id']
+    ChatSession.objects.bulk_create([ChatSession(pk=pk, user_id=user_id) for pk, user_id in owners.items()])
+
+    # Explicit primary keys do not advance the ID sequence on every backend
+    with schema_editor.connection.cursor() as cursor:
+        for sql in schema_editor.connection.ops.sequence_reset_sql(no_style(), [ChatSession]):
+            cursor.execute(sql)
+
+    for session in moved:
+        new_session = ChatSession.objects.create(user_id=session['user_id'])
+        messages = Message.objects.filter(session_id=session['session_id'], user_id=session['user_id'])
+        messages.update(session_id=str(new_session.pk))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munch', '0005_message_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(help_text='Unique identifier for the user who owns the session.', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='The time when the session was created')),
+            ],
+            options={
+                'verbose_name': 'Chat Session',
+                'verbose_name_plural': 'Chat Sessions',
+            },
+        ),
+        migrations.RunPython(backfill_sessions, migrations.RunPython.noop),
+    ]
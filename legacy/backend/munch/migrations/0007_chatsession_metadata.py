@@ -0,0 +1,52 @@
+# Generated by Django 5.1 on 2026-10-18 13:40
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.utils.timezone
+
+
+def backfill_metadata(apps, schema_editor):
+    """
+    Fills in the message count, last activity and title of existing sessions from their messages.
+    """
+    ChatSession = apps.get_model('munch', 'ChatSession')
+    Message = apps.get_model('munch', 'Message')
+
+    for session in ChatSession.objects.all():
+        messages = Message.objects.filter(session_id=str(session.pk), user_id=session.user_id)
+        stats = messages.aggregate(count=Count('id'), last=Max('timestamp'))
+        first = messages.filter(message_type='humanmessage_no_prompt').order_by('timestamp').first()
+        session.message_count = stats['count']
+        session.last_activity = stats['last'] or session.created_at
+        session.title = first.content[:100] if first else ''
+        session.save(update_fields=['message_count', 'last_activity', 'title'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munch', '0006_chatsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='The time when the last message was written to the session'),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, help_text='The number of messages stored for the session.'),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='title',
+            field=models.CharField(blank=True, default='', help_text='The first user message of the session.', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user_id', '-last_activity'], name='chatsession_user_activity_idx'),
+        ),
+        migrations.RunPython(backfill_metadata, migrations.RunPython.noop),
+    ]
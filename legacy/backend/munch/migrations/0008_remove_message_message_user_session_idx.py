@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 15:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munch', '0007_chatsession_metadata'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_user_session_idx',
+        ),
+    ]
@@ -4,6 +4,7 @@
 """Data models for SQLite database"""
 
 from django.db import models
+from django.utils import timezone
 
 class Message(models.Model):
     """
@@ -19,6 +20,8 @@ class Message(models.Model):
     message_type = models.CharField(max_length=10,
                                 help_text="Indicates whether the message is from a human or AI.")
     content = models.TextField(help_text="The text content of the message.")
+    place_ids = models.JSONField(default=list, blank=True,
+                                help_text="place_ids of the restaurants retrieved for this message.")
     timestamp = models.DateTimeField(auto_now_add=True, help_text="The time when the message was created")
 
     def __str__(self):
@@ -34,4 +37,44 @@ class Message(models.Model):
         """
         verbose_name = "Chat Message"
         verbose_name_plural = "Chat Messages"
-        ordering = ['-id']  # Orders by the latest messages first
\ No newline at end of file
+        ordering = ['-id']  # Orders by the latest messages first
+        indexes = [
+            # Session history and conversation lookups filter on (session_id, user_id)
+            # and order by timestamp
+            models.Index(fields=['session_id', 'user_id', 'timestamp'],
+                         name='message_session_user_ts_idx'),
+        ]
+
+
+class ChatSession(models.Model):
+    """
+    Model representing a chat session. The auto-incremented primary key is the session ID,
+    so allocating a new session is a single atomic insert.
+    """
+
+    user_id = models.CharField(max_length=100,
+                                help_text="Unique identifier for the user who owns the session.")
+    created_at = models.DateTimeField(auto_now_add=True, help_text="The time when the session was created")
+    last_activity = models.DateTimeField(default=timezone.now,
+                                help_text="The time when the last message was written to the session")
+    message_count = models.PositiveIntegerField(default=0,
+                                help_text="The number of messages stored for the session.")
+    title = models.CharField(max_length=100, blank=True, default='',
+                                help_text="The first user message of the session.")
+
+    def __str__(self):
+        """
+        Returns a string representation of the session, showing its ID and owner.
+        """
+        return f"Session {self.pk}: {self.user_id}"
+
+    class Meta:
+        """
+        Meta options for the ChatSession model.
+        """
+        verbose_name = "Chat Session"
+        verbose_name_plural = "Chat Sessions"
+        indexes = [
+            # Session listing filters on user_id and orders by recency
+            models.Index(fields=['user_id', '-last_activity'], name='chatsession_user_activity_idx'),
+        ]
@@ -0,0 +1,179 @@
+# pylint: disable=E0401
+# pylint: disable=W0718
+
+"""
+Rate limiting for incoming user messages.
+
+The limiter is chosen by the RATE_LIMIT setting:
+- memory: An in-process token bucket. Fastest, but each worker process keeps its own buckets.
+- cache: A fixed-window counter in a Django cache, shared by every process that uses the
+  same cache (e.g. django.core.cache.backends.redis.RedisCache or a local Memcached).
+
+Every message is checked against a per-session and a per-user limit.
+
+Functions:
+- get_rate_limiter: Returns the process-wide limiter configured by the RATE_LIMIT setting.
+- rate_limit_keys: Builds the limiter keys and limits for a user and session.
+"""
+
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+RATE_LIMIT_DEFAULTS = {
+    'BACKEND': 'memory',
+    'CACHE_ALIAS': 'default',
+    'SESSION_LIMIT': (10, 120),
+    'USER_LIMIT': (30, 120),
+}
+
+# Number of in-memory buckets kept before idle ones are pruned
+MAX_BUCKETS = 10000
+
+
+class TokenBucketRateLimiter:
+    """
+    In-process token bucket limiter. A bucket holds up to `rate` tokens and refills
+    at `rate / period` tokens per second. Each message takes one token.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty set of buckets.
+        """
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def _refill(self, key, rate, period, now):
+        """
+        Returns the current token count of a bucket after refilling it for the elapsed time.
+        """
+        tokens, last = self.buckets.get(key, (rate, now))
+        return min(rate, tokens + (now - last) * rate / period)
+
+    def hit(self, limits):
+        """
+        Takes one token from every bucket if all of them have one left.
+
+        Args:
+            limits (List[Tuple[str, int, int]]): (key, rate, period in seconds) for every bucket.
+
+        Returns:
+            bool: True if the message is allowed.
+        """
+        now = time.monotonic()
+        with self.lock:
+            tokens = [self._refill(key, rate, period, now) for key, rate, period in limits]
+            if any(t < 1 for t in tokens):
+                return False
+            for (key, _, _), t in zip(limits, tokens):
+                self.buckets[key] = (t - 1, now)
+            if len(self.buckets) > MAX_BUCKETS:
+                self._prune(now, max(period for _, _, period in limits))
+        return True
+
+    def _prune(self, now, period):
+        """
+        Drops buckets that have been idle long enough to be full again.
+        """
+        self.buckets = {key: (tokens, last) for key, (tokens, last) in self.buckets.items()
+                        if now - last < period}
+
+
+class CacheRateLimiter:
+    """
+    Fixed-window counter limiter backed by a Django cache, so limits are shared across processes.
+    """
+
+    def __init__(self, alias):
+        """
+        Initializes the limiter on top of the given cache.
+
+        Args:
+            alias (str): The name of the cache in the CACHES setting.
+        """
+        self.cache = caches[alias]
+
+    def hit(self, limits):
+        """
+        Counts the message in the current window of every key.
+
+        Args:
+            limits (List[Tuple[str, int, int]]): (key, rate, period in seconds) for every counter.
+
+        Returns:
+            bool: True if the message is allowed.
+        """
+        now = int(time.time())
+        allowed = True
+        for key, rate, period in limits:
+            window_key = f'ratelimit:{key}:{now // period}'
+            self.cache.add(window_key, 0, timeout=period)
+            try:
+                count = self.cache.incr(window_key)
+            except ValueError:
+                # The window expired between add and incr
+                self.cache.set(window_key, 1, timeout=period)
+                count = 1
+            if count > rate:
+                allowed = False
+        return allowed
+
+
+_lock = threading.Lock()
+_limiter = None
+
+
+def rate_limit_policy():
+    """
+    Returns the RATE_LIMIT setting merged over the defaults.
+
+    Returns:
+        Dict: The rate limit policy.
+    """
+    return {**RATE_LIMIT_DEFAULTS, **getattr(settings, 'RATE_LIMIT', {})}
+
+
+def get_rate_limiter():
+    """
+    Returns the process-wide limiter configured by the RATE_LIMIT setting, creating it on first use.
+
+    Returns:
+        Union[TokenBucketRateLimiter, CacheRateLimiter]: The shared limiter.
+
+    Raises:
+        ValueError: If the configured backend is unknown.
+    """
+    global _limiter  # pylint: disable=W0603
+    if _limiter is None:
+        with _lock:
+            if _limiter is None:
+                policy = rate_limit_policy()
+                if policy['BACKEND'] == 'memory':
+                    _limiter = TokenBucketRateLimiter()
+                elif policy['BACKEND'] == 'cache':
+                    _limiter = CacheRateLimiter(policy['CACHE_ALIAS'])
+                else:
+                    raise ValueError(f"Unknown rate limit backend: {policy['BACKEND']}")
+    return _limiter
+
+
+def rate_limit_keys(session_id, user_id):
+    """
+    Builds the per-session and per-user limiter keys with their limits.
+
+    Args:
+        session_id (str): The session the message is sent to.
+        user_id (str): The user sending the message.
+
+    Returns:
+        List[Tuple[str, int, int]]: (key, rate, period in seconds) for every limit.
+    """
+    policy = rate_limit_policy()
+    session_rate, session_period = policy['SESSION_LIMIT']
+    user_rate, user_period = policy['USER_LIMIT']
+    return [
+        (f'session:{user_id}:{session_id}', session_rate, session_period),
+        (f'user:{user_id}', user_rate, user_period),
+    ]
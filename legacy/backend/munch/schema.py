@@ -2,7 +2,7 @@
 # pylint: disable=W0718
 
 from ninja import Schema
-from typing import List
+from typing import Optional
 
 class MessageRequest(Schema):
     """
@@ -12,6 +12,8 @@ class MessageRequest(Schema):
     user_id: str
     user_message: str  # The message input provided by the user.
     session_id: str     # The unique identifier for the current chat session.
+    latitude: Optional[float] = None   # The user's location, for "near me" queries.
+    longitude: Optional[float] = None
 
 class FindSessionIDsRequest(Schema):
     """
@@ -31,3 +33,12 @@ class GetConversation(Schema):
     user_id: str     # The unique identifier for the current chat session.
     session_id: str
 
+
+class GetUserSessions(Schema):
+    """
+    Schema representing the expected structure of an incoming API request
+    for a page of a user's sessions, most recently active first.
+    """
+    user_id: str     # The unique identifier for the user.
+    offset: int = 0  # The number of sessions to skip.
+    limit: int = 50  # The maximum number of sessions to return.
@@ -0,0 +1,154 @@
+# pylint: disable=E0401
+# pylint: disable=W0718
+
+"""
+Semantic cache for user queries.
+
+Queries are matched by the cosine similarity of their embeddings, so near-duplicate questions
+("sushi in Santa Monica" / "sushi in santa monica?") reuse the retrieved restaurants and, for
+the first turn of a session, the whole answer. Entries expire after a TTL and the least
+recently used entry is evicted once the cache is full. Queries only match entries retrieved
+with the same metadata filters, so "cheap sushi" never reuses the results of "sushi".
+"""
+
+import json
+import threading
+import time
+import numpy as np
+
+
+class SemanticCacheEntry:
+    """
+    A cached query: its retrieved documents and, when it opened a session, the LLM answer.
+    """
+
+    def __init__(self, docs, answer=None, filters=None):
+        """
+        Initializes the entry.
+
+        Args:
+            docs (List[Document]): The documents retrieved for the query.
+            answer (Optional[str]): The answer given to the query as the first turn of a session.
+            filters (Optional[Dict]): The metadata filters the documents were retrieved with.
+        """
+        self.docs = docs
+        self.answer = answer
+        self.filters = filters
+
+
+class SemanticCache:
+    """
+    In-process semantic cache. Embeddings live in a preallocated float32 matrix, and the
+    creation time, last use and filter key of every slot in arrays, so a lookup is a single
+    matrix-vector product plus vectorized comparisons.
+    """
+
+    def __init__(self, threshold=0.95, ttl=3600, max_entries=1000):
+        """
+        Initializes an empty cache.
+
+        Args:
+            threshold (float): Minimum cosine similarity for two queries to match.
+            ttl (float): Seconds before an entry expires.
+            max_entries (int): Maximum number of cached queries.
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.vectors = None
+        self.entries = [None] * max_entries
+        self.created_at = np.full(max_entries, -np.inf)  # -inf marks an empty slot
+        self.last_used = np.full(max_entries, -np.inf)
+        self.filter_keys = np.zeros(max_entries, dtype=np.int64)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _filter_key(filters):
+        """
+        Hashes metadata filters into an integer, equal filters always get the same key.
+        """
+        return hash(json.dumps(filters, sort_keys=True))
+
+    def _similarities(self, vector, now, filter_key):
+        """
+        Returns the similarity of the query to every slot, -inf for empty or expired slots
+        and -2 (below any cosine similarity, but not free) for entries with other filters.
+        """
+        if self.vectors is None:
+            return np.full(self.max_entries, -np.inf, dtype=np.float32)
+        similarities = self.vectors @ vector
+        expired = (self.created_at == -np.inf) | (now - self.created_at > self.ttl)
+        similarities[~expired & (self.filter_keys != filter_key)] = -2.0
+        similarities[expired] = -np.inf
+        return similarities
+
+    @staticmethod
+    def _normalize(embedding):
+        """
+        Returns the embedding as a unit-length float32 vector.
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, filters=None):
+        """
+        Finds the most similar cached query above the threshold.
+
+        Args:
+            embedding (List[float]): The query embedding.
+            filters (Optional[Dict]): The metadata filters of the query.
+
+        Returns:
+            Optional[SemanticCacheEntry]: The matching entry, None on a miss.
+        """
+        vector = self._normalize(embedding)
+        now = time.monotonic()
+        with self.lock:
+            similarities = self._similarities(vector, now, self._filter_key(filters))
+            slot = int(np.argmax(similarities))
+            # Filter keys are hashes, so the match is confirmed on the filters themselves
+            if similarities[slot] < self.threshold or self.entries[slot].filters != filters:
+                return None
+            self.last_used[slot] = now
+            return self.entries[slot]
+
+    def store(self, embedding, docs, answer=None, filters=None):
+        """
+        Caches the documents and optional answer for a query, replacing a near-duplicate
+        entry, then an empty or expired slot, then the least recently used entry.
+
+        Args:
+            embedding (List[float]): The query embedding.
+            docs (List[Document]): The documents retrieved for the query.
+            answer (Optional[str]): The answer given to the query as the first turn of a session.
+            filters (Optional[Dict]): The metadata filters the documents were retrieved with.
+        """
+        vector = self._normalize(embedding)
+        now = time.monotonic()
+        filter_key = self._filter_key(filters)
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            similarities = self._similarities(vector, now, filter_key)
+            slot = int(np.argmax(similarities))
+            if similarities[slot] < self.threshold:
+                free = np.flatnonzero(similarities == -np.inf)
+                slot = int(free[0]) if len(free) else int(np.argmin(self.last_used))
+            elif answer is None:
+                # Keep the answer of the near-duplicate entry
+                answer = self.entries[slot].answer
+            self.vectors[slot] = vector
+            self.entries[slot] = SemanticCacheEntry(docs, answer, filters)
+            self.created_at[slot] = self.last_used[slot] = now
+            self.filter_keys[slot] = filter_key
+
+    def clear(self):
+        """
+        Drops every cached query.
+        """
+        with self.lock:
+            self.vectors = None
+            self.entries = [None] * self.max_entries
+            self.created_at[:] = -np.inf
+            self.last_used[:] = -np.inf
@@ -3,6 +3,432 @@
 # pylint: disable=C0114
 # pylint: disable=W0611
 
-from django.test import TestCase
+import importlib
+import threading
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage
+from utils.geo_index import GeoIndex
+from utils.helpers import generate_prompt
+from . import api, clients
+from .custom_chat_history import (CustomChatMessageHistory, apply_history_policy,
+                                  get_next_available_session, get_sessions, touch_session)
+from .models import ChatSession, Message
+from .prompts import SESSION_PREAMBLE
+from .rate_limit import TokenBucketRateLimiter
+from .semantic_cache import SemanticCache
+
+
+class ClientRegistryTests(TestCase):
+    """
+    Checks that the client getters share one instance per process, including clients
+    whose factories build their dependencies through the registry.
+    """
+
+    def setUp(self):
+        clients.shutdown()
+        self.addCleanup(clients.shutdown)
+        for name in ('chromadb_init', 'ChatOpenAI', 'RunnableWithMessageHistory'):
+            patcher = mock.patch.object(clients, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def build_all(self, results):
+        results['retriever'] = clients.get_retriever()
+        results['chain'] = clients.get_chain()
+
+    @override_settings(VECTOR_STORE_BACKEND='chroma')
+    def test_nested_construction_does_not_block(self):
+        results = {}
+        thread = threading.Thread(target=self.build_all, args=(results,), daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive(), 'client construction deadlocked')
+        self.assertIs(results['retriever'], clients.get_retriever())
+        self.assertIs(results['chain'], clients.get_chain())
+
+    @override_settings(VECTOR_STORE_BACKEND='chroma')
+    def test_getters_return_shared_instances(self):
+        self.assertIs(clients.get_vector_store(), clients.get_vector_store())
+        self.assertIs(clients.get_llm(), clients.get_llm())
+        clients.get_chain()
+        clients.get_chain()
+        clients.ChatOpenAI.assert_called_once()
+        clients.chromadb_init.assert_called_once()
+
+
+class AsyncEndpointTestCase(TestCase):
+    """
+    Base for the async endpoint tests, with retrieval and the LLM patched out.
+    """
+
+    payload = {'user_id': 'user1', 'user_message': 'ramen?', 'session_id': '1'}
+
+    def setUp(self):
+        self.llm = mock.Mock()
+        docs = [Document(page_content='Name: Daikokuya', metadata={'place_id': 'p1'})]
+        for name, value in (('retrieve', mock.Mock(return_value=([1.0, 0.0], None, docs, None))),
+                            ('get_llm', mock.Mock(return_value=self.llm)),
+                            ('get_semantic_cache', mock.Mock(return_value=None))):
+            patcher = mock.patch.object(api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stored(self):
+        """Returns the (message_type, content) rows of the session in insertion order."""
+        return list(Message.objects.filter(session_id='1', user_id='user1')
+                    .order_by('pk').values_list('message_type', 'content'))
+
+    async def post(self, path):
+        return await self.async_client.post(path, self.payload, content_type='application/json')
+
+
+class AsyncMessageTests(AsyncEndpointTestCase):
+    """
+    Checks the async /amessage endpoint.
+    """
+
+    async def test_replies_and_saves_the_turn(self):
+        self.llm.ainvoke = mock.AsyncMock(return_value=AIMessage(content='Try Daikokuya'))
+        response = await self.post('/api/amessage')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'message_type': 'aimessage', 'content': 'Try Daikokuya'})
+
+        history = self.llm.ainvoke.call_args.args[0]
+        self.assertEqual(history[:len(SESSION_PREAMBLE)], list(SESSION_PREAMBLE))
+        self.assertEqual(history[-1].additional_kwargs['user_query'], 'ramen?')
+        stored = await sync_to_async(self.stored)()
+        self.assertEqual([message_type for message_type, _ in stored],
+                         ['humanmessage_no_prompt', 'humanmessage', 'aimessage'])
+        self.assertEqual(stored[-1][1], 'Try Daikokuya')
+
+    async def test_llm_failure_returns_error(self):
+        self.llm.ainvoke = mock.AsyncMock(side_effect=RuntimeError('timeout'))
+        response = await self.post('/api/amessage')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {'error': 'An unexpected error occurred.'})
+        self.assertEqual(await sync_to_async(self.stored)(), [('humanmessage_no_prompt', 'ramen?')])
+
+
+class MessageStreamTests(AsyncEndpointTestCase):
+    """
+    Checks the SSE framing of /message_stream, its error event and that the turn
+    is saved once the stream completes.
+    """
+
+    async def events(self, *chunks):
+        """
+        Streams a reply made of `chunks`, where an exception is raised instead of yielded.
+        Returns every event with the session rows stored when it arrived.
+        """
+        async def astream(messages):
+            for chunk in chunks:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield AIMessageChunk(content=chunk)
+        self.llm.astream = astream
+        response = await self.post('/api/message_stream')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return [(event.decode(), await sync_to_async(self.stored)())
+                async for event in response.streaming_content]
+
+    async def test_streams_tokens_then_saves_the_turn(self):
+        events = await self.events('Try ', '', 'Daikokuya')
+        self.assertEqual([event for event, _ in events], [
+            'event: token\ndata: {"content": "Try "}\n\n',
+            'event: token\ndata: {"content": "Daikokuya"}\n\n',
+            'event: aimessage\ndata: {"message_type": "aimessage", "content": "Try Daikokuya"}\n\n',
+        ])
+        # Only the raw user message is stored while tokens arrive
+        for _, stored in events[:2]:
+            self.assertEqual(stored, [('humanmessage_no_prompt', 'ramen?')])
+        stored = events[-1][1]
+        self.assertEqual([message_type for message_type, _ in stored],
+                         ['humanmessage_no_prompt', 'humanmessage', 'aimessage'])
+        self.assertEqual(stored[-1][1], 'Try Daikokuya')
+
+    async def test_llm_failure_ends_with_error_event(self):
+        events = await self.events('Try ', RuntimeError('timeout'))
+        self.assertEqual([event for event, _ in events], [
+            'event: token\ndata: {"content": "Try "}\n\n',
+            'event: error\ndata: {"error": "An unexpected error occurred."}\n\n',
+        ])
+        self.assertEqual(events[-1][1], [('humanmessage_no_prompt', 'ramen?')])
+
+
+class RetrieveTests(TestCase):
+    """
+    Checks that only standalone searches are restricted to the filters found in the message.
+    """
+
+    def setUp(self):
+        vector_store = mock.Mock()
+        vector_store.embeddings.embed_query.return_value = [1.0, 0.0]
+        self.search = mock.Mock(return_value=[])
+        for name, value in (('get_vector_store', mock.Mock(return_value=vector_store)),
+                            ('get_known_cities', mock.Mock(return_value=['Irvine'])),
+                            ('get_geo_index', mock.Mock(return_value=GeoIndex.from_metadata([
+                                {'place_id': 'little_tokyo', 'latitude': 34.0505,
+                                 'longitude': -118.2405}]))),
+                            ('get_lexical_index', mock.Mock(return_value=None)),
+                            ('get_semantic_cache', mock.Mock(return_value=None)),
+                            ('hybrid_search', self.search)):
+            patcher = mock.patch.object(api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_standalone_search_is_filtered(self):
+        _, filters, _, _ = api.retrieve('cheap sushi in Irvine')
+        self.assertEqual(filters, {'$and': [{'price_level': {'$in': [0, 1, 2]}},
+                                            {'city': {'$eq': 'Irvine'}}]})
+        self.assertEqual(self.search.call_args.kwargs['where'], filters)
+
+    def test_follow_up_question_is_not_filtered(self):
+        _, filters, _, _ = api.retrieve('Is it expensive?')
+        self.assertIsNone(filters)
+        self.assertIsNone(self.search.call_args.kwargs['where'])
+
+    def test_location_query_is_restricted_to_the_radius(self):
+        _, filters, _, _ = api.retrieve('ramen near me', (34.0502, -118.2401))
+        self.assertEqual(filters, {'place_id': {'$in': ['little_tokyo']}})
+        self.assertEqual(self.search.call_args.kwargs['where'], filters)
+
+    def test_nothing_nearby_retrieves_nothing(self):
+        _, filters, docs, hit = api.retrieve('ramen near me', (33.6846, -117.8265))
+        self.assertEqual((filters, docs, hit), ({'place_id': {'$in': []}}, [], None))
+        self.search.assert_not_called()
+
+
+class MessageQueryPlanTests(TestCase):
+    """
+    Checks that the hot Message query is served by the composite index
+    instead of scanning the whole table.
+    """
+
+    def setUp(self):
+        for i in range(20):
+            Message.objects.create(session_id=str(i % 4), user_id=f'user{i % 2}',
+                                   message_type='aimessage', content=f'message {i}')
+
+    def test_session_history_uses_session_index(self):
+        plan = Message.objects.filter(session_id='1', user_id='user1').order_by('timestamp').explain()
+        self.assertIn('message_session_user_ts_idx', plan)
+
+
+def make_turns(count, length=40):
+    """Builds `count` past turns whose prompt and reply are `length` characters long."""
+    return [[HumanMessage(content=f'{i}'.ljust(length, 'q')), AIMessage(content=f'{i}'.ljust(length, 'a'))]
+            for i in range(count)]
+
+
+class HistoryPolicyTests(TestCase):
+    """
+    Checks how stored messages are grouped into turns and bounded by the CHAT_HISTORY policy.
+    """
+
+    no_limits = {'MAX_TURNS': None, 'MAX_TOKENS': None, 'SUMMARIZE': False,
+                 'STRIP_CONTEXT': True, 'STORE_CONTEXT': True}
+
+    def store(self, *rows):
+        """Stores (message_type, content) rows one second apart, so timestamps never tie."""
+        start = timezone.now() - timedelta(minutes=1)
+        for i, (message_type, content) in enumerate(rows):
+            message = Message.objects.create(session_id='1', user_id='user1',
+                                             message_type=message_type, content=content)
+            Message.objects.filter(pk=message.pk).update(timestamp=start + timedelta(seconds=i))
+
+    @override_settings(CHAT_HISTORY=no_limits)
+    def test_groups_turns_and_skips_legacy_preamble_rows(self):
+        self.store(
+            ('humanmessage', 'old instructions'),
+            ('aimessage', 'Got it!'),
+            ('humanmessage_no_prompt', 'ramen?'),
+            ('humanmessage', generate_prompt('Name: Daikokuya', 'ramen?')),
+            ('aimessage', 'Try Daikokuya'),
+            ('humanmessage_no_prompt', 'cheaper?'),
+            ('humanmessage', generate_prompt('Name: Shin-Sen-Gumi', 'cheaper?')),
+            ('aimessage', 'Try Shin-Sen-Gumi'),
+        )
+        history = CustomChatMessageHistory(session_id='1', user_id='user1')
+        self.assertEqual(history.messages[:len(SESSION_PREAMBLE)], list(SESSION_PREAMBLE))
+        self.assertEqual([(m.type, m.content) for m in history.messages[len(SESSION_PREAMBLE):]],
+                         [('human', 'ramen?'), ('ai', 'Try Daikokuya'),
+                          ('human', 'cheaper?'), ('ai', 'Try Shin-Sen-Gumi')])
+
+    @override_settings(CHAT_HISTORY={**no_limits, 'MAX_TURNS': 1, 'MAX_TOKENS': 1})
+    def test_counts_stored_turns_before_trimming(self):
+        self.assertEqual(CustomChatMessageHistory(session_id='1', user_id='user1').stored_turns, 0)
+        self.store(
+            ('humanmessage_no_prompt', 'ramen?'),
+            ('humanmessage', 'ramen?'),
+            ('aimessage', 'Try Daikokuya'),
+        )
+        history = CustomChatMessageHistory(session_id='1', user_id='user1')
+        self.assertEqual(history.messages, list(SESSION_PREAMBLE))
+        self.assertEqual(history.stored_turns, 1)
+
+    @override_settings(CHAT_HISTORY={**no_limits, 'MAX_TURNS': 2})
+    def test_keeps_last_turns(self):
+        messages = apply_history_policy(make_turns(5))
+        self.assertEqual([m.content[0] for m in messages], ['3', '3', '4', '4'])
+
+    @override_settings(CHAT_HISTORY={**no_limits, 'MAX_TURNS': 2, 'SUMMARIZE': True})
+    def test_summarizes_whole_chunks(self):
+        with mock.patch('munch.custom_chat_history.summarize_turns', return_value='likes ramen') as summarize:
+            # 3 turns: nothing to summarize until a whole chunk of 2 turns falls out
+            self.assertEqual(len(apply_history_policy(make_turns(3))), 6)
+            summarize.assert_not_called()
+
+            # 5 turns: turns 0-1 are summarized, turns 2-4 are kept
+            messages = apply_history_policy(make_turns(5))
+            key, chunk_size = summarize.call_args.args
+            self.assertEqual((len(key), chunk_size), (2, 2))
+            self.assertEqual(messages[0], SystemMessage(content='Summary of the earlier conversation: likes ramen'))
+            self.assertEqual([m.content[0] for m in messages[1:]], ['2', '2', '3', '3', '4', '4'])
+
+            # 6 turns: the cut moves by a whole chunk, turns 0-3 are summarized
+            messages = apply_history_policy(make_turns(6))
+            self.assertEqual(len(summarize.call_args.args[0]), 4)
+            self.assertEqual([m.content[0] for m in messages[1:]], ['4', '4', '5', '5'])
+
+    @override_settings(CHAT_HISTORY={**no_limits, 'MAX_TOKENS': 50})
+    def test_trims_oldest_turns_to_token_budget(self):
+        # Every 40-character message counts as 11 tokens, so two turns fit in 50
+        messages = apply_history_policy(make_turns(4))
+        self.assertEqual([m.content[0] for m in messages], ['2', '2', '3', '3'])
+
+    @override_settings(CHAT_HISTORY={**no_limits, 'MAX_TOKENS': 50})
+    def test_strips_context_before_counting_tokens(self):
+        prompt = HumanMessage(content=generate_prompt('Review/About: ' + 'great noodles ' * 100, 'ramen?'))
+        messages = apply_history_policy([[prompt, AIMessage(content='Try Daikokuya')]])
+        self.assertEqual([m.content for m in messages], ['ramen?', 'Try Daikokuya'])
+
+    @override_settings(CHAT_HISTORY={**no_limits, 'MAX_TURNS': 1, 'STRIP_CONTEXT': False})
+    def test_rebuilds_context_only_for_kept_turns(self):
+        turns = [[HumanMessage(content=f'query {i}', additional_kwargs={'place_ids': [f'p{i}']}),
+                  AIMessage(content=f'reply {i}')] for i in range(3)]
+        with mock.patch('munch.custom_chat_history.rebuild_prompt', return_value='rebuilt') as rebuild:
+            messages = apply_history_policy(turns)
+        rebuild.assert_called_once_with('query 2', ['p2'])
+        self.assertEqual([m.content for m in messages], ['rebuilt', 'reply 2'])
+
+
+class SessionAllocationTests(TestCase):
+    """
+    Checks that session IDs are allocated without scanning existing messages.
+    """
+
+    def test_allocates_distinct_sessions(self):
+        first = get_next_available_session('user1')
+        second = get_next_available_session('user1')
+        self.assertNotEqual(first, second)
+
+    def test_allocation_does_not_query_messages(self):
+        Message.objects.create(session_id='0', user_id='user1', message_type='aimessage', content='hi')
+        with self.assertNumQueries(1):
+            get_next_available_session('user2')
+
+
+class SessionListingTests(TestCase):
+    """
+    Checks that session metadata is kept up to date on write and listed by recency.
+    """
+
+    def test_lists_most_recent_first(self):
+        older = get_next_available_session('user1')
+        newer = get_next_available_session('user1')
+        touch_session(older, 'user1', title='sushi in Santa Monica')
+        touch_session(newer, 'user1', title='ramen in Little Tokyo')
+        touch_session(older, 'user1')
+
+        sessions = get_sessions('user1')
+        self.assertEqual([s['session_id'] for s in sessions], [older, newer])
+        self.assertEqual(sessions[0]['title'], 'sushi in Santa Monica')
+        self.assertEqual(sessions[0]['message_count'], 2)
+
+    def test_listing_uses_activity_index(self):
+        plan = ChatSession.objects.filter(user_id='user1').order_by('-last_activity').explain()
+        self.assertIn('chatsession_user_activity_idx', plan)
+
+
+class SessionBackfillTests(TestCase):
+    """
+    Checks that the ChatSession backfill of migration 0006 gives every user their own sessions.
+    """
+
+    def test_moves_session_ids_shared_by_users_to_new_sessions(self):
+        for user_id, session_id in (('user1', '1'), ('user2', '1'), ('user2', '2'), ('user2', '1')):
+            Message.objects.create(session_id=session_id, user_id=user_id,
+                                   message_type='humanmessage_no_prompt', content=f'{user_id} in {session_id}')
+        migration = importlib.import_module('munch.migrations.0006_chatsession')
+        migration.backfill_sessions(apps, connection.schema_editor())
+
+        self.assertEqual(ChatSession.objects.get(pk=1).user_id, 'user1')
+        self.assertEqual(ChatSession.objects.get(pk=2).user_id, 'user2')
+        moved = Message.objects.get(user_id='user2', content='user2 in 1').session_id
+        self.assertNotIn(moved, ('1', '2'))
+        self.assertEqual(Message.objects.filter(session_id=moved, user_id='user2').count(), 2)
+        self.assertEqual(Message.objects.filter(session_id='1').count(), 1)
+
+        touch_session(moved, 'user2')
+        self.assertEqual(sorted(s['session_id'] for s in get_sessions('user2')), sorted(['2', moved]))
+        self.assertNotIn(get_next_available_session('user3'), ('1', '2', moved))
+
+
+class TokenBucketRateLimiterTests(TestCase):
+    """
+    Checks the in-process token bucket limiter.
+    """
+
+    def test_blocks_after_rate_is_used_up(self):
+        limiter = TokenBucketRateLimiter()
+        limits = [('session:user1:0', 3, 120)]
+        self.assertTrue(all(limiter.hit(limits) for _ in range(3)))
+        self.assertFalse(limiter.hit(limits))
+
+    def test_blocked_key_does_not_consume_other_keys(self):
+        limiter = TokenBucketRateLimiter()
+        limiter.hit([('session:user1:0', 1, 120)])
+        self.assertFalse(limiter.hit([('session:user1:0', 1, 120), ('user:user1', 1, 120)]))
+        self.assertTrue(limiter.hit([('user:user1', 1, 120)]))
+
+
+class SemanticCacheTests(TestCase):
+    """
+    Checks matching, expiry and eviction in the semantic query cache.
+    """
+
+    def test_matches_near_duplicate_queries(self):
+        cache = SemanticCache(threshold=0.9, ttl=60, max_entries=2)
+        cache.store([1.0, 0.0, 0.0], ['sushi docs'], answer='Try Sugarfish')
+        hit = cache.lookup([0.99, 0.05, 0.0])
+        self.assertEqual(hit.docs, ['sushi docs'])
+        self.assertEqual(hit.answer, 'Try Sugarfish')
+        self.assertIsNone(cache.lookup([0.0, 1.0, 0.0]))
+
+    def test_expired_entries_miss(self):
+        cache = SemanticCache(threshold=0.9, ttl=-1, max_entries=2)
+        cache.store([1.0, 0.0], ['docs'])
+        self.assertIsNone(cache.lookup([1.0, 0.0]))
+
+    def test_misses_entries_with_other_filters(self):
+        cache = SemanticCache(threshold=0.9, ttl=60, max_entries=2)
+        cache.store([1.0, 0.0], ['all sushi'])
+        self.assertIsNone(cache.lookup([1.0, 0.0], {'price_level': {'$in': [1, 2]}}))
+        self.assertEqual(cache.lookup([1.0, 0.0]).docs, ['all sushi'])
+
+    def test_evicts_least_recently_used(self):
+        cache = SemanticCache(threshold=0.9, ttl=60, max_entries=2)
+        cache.store([1.0, 0.0, 0.0], ['a'])
+        cache.store([0.0, 1.0, 0.0], ['b'])
+        cache.lookup([1.0, 0.0, 0.0])
+        cache.store([0.0, 0.0, 1.0], ['c'])
+        self.assertIsNotNone(cache.lookup([1.0, 0.0, 0.0]))
+        self.assertIsNone(cache.lookup([0.0, 1.0, 0.0]))
 
-# Create your tests here.
@@ -150,4 +150,47 @@ CORS_ALLOW_HEADERS = [
     'content-type',
     'authorization',
     'x-csrftoken',
-]
\ No newline at end of file
+]
+
+# Chat history replayed to the LLM on every turn (see munch/custom_chat_history.py)
+CHAT_HISTORY = {
+    'MAX_TURNS': 10,        # Keep only the last N user/AI turns, None for no limit
+    'MAX_TOKENS': 4000,     # Approximate token budget for the replayed turns, None for no limit
+    'SUMMARIZE': False,     # Replace turns dropped by MAX_TURNS with a rolling LLM summary
+    'STRIP_CONTEXT': True,  # Drop the retrieved restaurant context from past prompts
+    'STORE_CONTEXT': False, # Store full prompts instead of the raw query plus retrieved place_ids
+}
+
+# Rate limits for user messages (see munch/rate_limit.py)
+RATE_LIMIT = {
+    'BACKEND': 'memory',            # 'memory' (in-process token bucket) or 'cache' (shared Django cache)
+    'CACHE_ALIAS': 'default',       # Cache used by the 'cache' backend, e.g. a RedisCache
+    'SESSION_LIMIT': (10, 120),     # At most 10 messages per session every 2 minutes
+    'USER_LIMIT': (30, 120),        # At most 30 messages per user every 2 minutes
+}
+
+# Semantic cache for near-duplicate user queries (see munch/semantic_cache.py)
+SEMANTIC_CACHE = {
+    'ENABLED': True,
+    'THRESHOLD': 0.95,      # Minimum cosine similarity between two queries to reuse results
+    'TTL': 3600,            # Seconds before a cached query expires
+    'MAX_ENTRIES': 1000,    # Least recently used queries are evicted past this size
+}
+
+# Vector store used for retrieval: 'chroma' or 'numpy' (in-process, see utils/numpy_store.py)
+VECTOR_STORE_BACKEND = 'chroma'
+
+# Hybrid retrieval: BM25 over names, keywords, addresses and summaries fused with vector search.
+# Falls back to vector search alone while the index file has not been built by ingestion.
+HYBRID_SEARCH = {
+    'ENABLED': True,
+    'INDEX_PATH': 'backend/lexical_index.json',
+    'CANDIDATES': 20,       # Documents taken from each search before reciprocal rank fusion
+}
+
+# Radius retrieval ("near me", "near Little Tokyo") over the spatial index built by ingestion
+GEO_SEARCH = {
+    'ENABLED': True,
+    'INDEX_PATH': 'backend/geo_index.json',
+    'DEFAULT_RADIUS_KM': 2.0,
+}
@@ -0,0 +1,128 @@
+# utils/dataset.py
+
+# pylint: disable=E0401
+
+"""
+This module reads and writes restaurant datasets, shared by the scrapers and the ingestion scripts.
+
+The canonical format is JSON Lines: one restaurant object per line, so datasets are read
+and written as streams and memory stays flat however many restaurants they hold. Legacy
+JSON array files are still readable. Datasets can be exported to Parquet for analytics
+when pyarrow is installed.
+
+Functions:
+- read_restaurants: Yields the restaurants of a JSON Lines (or legacy JSON) dataset.
+- write_restaurants: Writes restaurants to a JSON Lines dataset.
+- batched: Groups an iterable into lists of a fixed size.
+- export_parquet: Converts a dataset to a Parquet file.
+"""
+
+import json
+import os
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+def read_restaurants(path: str) -> Iterator[Dict]:
+    """
+    Yields the restaurants of a dataset one at a time.
+
+    Args:
+        path (str): Path to a JSON Lines file, or to a legacy file holding one JSON array.
+
+    Yields:
+        Dict: The next restaurant.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.endswith('.json'):
+            # Legacy format, the whole array has to be parsed at once
+            yield from json.load(file)
+            return
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+def write_restaurants(path: str, restaurants: Iterable[Dict]) -> int:
+    """
+    Writes restaurants to a JSON Lines dataset, replacing the file atomically.
+
+    Args:
+        path (str): Path to the JSON Lines file.
+        restaurants (Iterable[Dict]): The restaurants, consumed as a stream.
+
+    Returns:
+        int: The number of restaurants written.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    count = 0
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        for restaurant in restaurants:
+            file.write(json.dumps(restaurant, ensure_ascii=False) + '\n')
+            count += 1
+    os.replace(path + '.tmp', path)
+    return count
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    """
+    Groups an iterable into lists of `size` items, the last one possibly shorter.
+
+    Args:
+        iterable (Iterable): The items.
+        size (int): The number of items per list.
+
+    Yields:
+        List: The next group of items.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def export_parquet(path: str, parquet_path: str, batch_size: int = 10000) -> int:
+    """
+    Converts a dataset to a Parquet file, streaming it in batches.
+
+    Args:
+        path (str): Path to the JSON Lines (or legacy JSON) dataset.
+        parquet_path (str): Path to the Parquet file to write.
+        batch_size (int): Number of restaurants converted at a time.
+
+    Returns:
+        int: The number of restaurants written.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa  # pylint: disable=C0415
+        import pyarrow.parquet as pq  # pylint: disable=C0415
+    except ImportError as e:
+        raise ImportError('Parquet export requires pyarrow: pip install pyarrow') from e
+
+    # 'Unknown' placeholders from the scrapers become nulls so numeric columns stay numeric
+    schema = pa.schema([
+        ('place_id', pa.string()),
+        ('name', pa.string()),
+        ('keywords', pa.list_(pa.string())),
+        ('address', pa.string()),
+        ('rating', pa.float64()),
+        ('price_level', pa.string()),
+        ('num_of_reviews', pa.int64()),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('reviews', pa.list_(pa.string())),
+    ])
+    numeric = {'rating', 'num_of_reviews', 'latitude', 'longitude'}
+
+    count = 0
+    with pq.ParquetWriter(parquet_path, schema) as writer:
+        for batch in batched(read_restaurants(path), batch_size):
+            columns = {
+                field.name: [r.get(field.name) if field.name not in numeric
+                             or isinstance(r.get(field.name), (int, float)) else None
+                             for r in batch]
+                for field in schema
+            }
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            count += len(batch)
+    return count
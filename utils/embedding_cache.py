@@ -0,0 +1,199 @@
+# utils/embedding_cache.py
+
+# pylint: disable=E0401
+
+"""
+This module provides a persistent, size-bounded cache in front of an embeddings model.
+
+Embeddings are keyed by the model name and a hash of the text, stored in SQLite and evicted
+least recently used first. The same cache serves ingestion (embed_documents) and query-time
+retrieval (embed_query), so repeated queries and unchanged documents skip the network call.
+Cache hits only read: their last-used times are written in batches, at the latest right
+before an eviction needs them.
+
+Classes:
+- CachedEmbeddings: LangChain Embeddings wrapper backed by the cache.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List
+from langchain_core.embeddings import Embeddings
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from a local SQLite LRU cache.
+    """
+
+    def __init__(self, underlying: Embeddings, model: str, path: str, max_entries: int = 100000,
+                 touch_batch_size: int = 256):
+        """
+        Opens or creates the cache database.
+
+        Args:
+            underlying (Embeddings): The embeddings model used on cache misses.
+            model (str): The model name, part of every cache key.
+            path (str): Path to the SQLite file.
+            max_entries (int): Maximum number of cached embeddings before the least
+                recently used ones are evicted.
+            touch_batch_size (int): Number of cache hits whose last-used time is kept in
+                memory before they are written in one transaction.
+        """
+        self.underlying = underlying
+        self.model = model
+        self.max_entries = max_entries
+        self.touch_batch_size = touch_batch_size
+        self.touched = {}  # Last-used time by key of the hits not written yet
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Shared by the worker threads of the web server, access is serialized by self.lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings (last_used)"
+            )
+        # Kept up to date on every write, so storing does not count the table
+        (self.count,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+
+    def _key(self, text: str) -> str:
+        """
+        Returns the cache key of a text for this model.
+        """
+        return hashlib.sha256(f'{self.model}\0{text}'.encode('utf-8')).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Fetches the cached embeddings for the given keys and marks them as recently used.
+        The last-used times are written once touch_batch_size hits are pending.
+        """
+        found = {}
+        with self.lock:
+            # Stay under SQLite's limit on the number of bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                found.update((key, array('f', vector).tolist()) for key, vector in rows)
+            if found:
+                self.touched.update(dict.fromkeys(found, time.time()))
+                if len(self.touched) >= self.touch_batch_size:
+                    self._write_touched()
+        return found
+
+    def _write_touched(self) -> None:
+        """
+        Writes the pending last-used times of cache hits. Must be called with self.lock held.
+        """
+        if self.touched:
+            with self.conn:
+                self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                      [(when, key) for key, when in self.touched.items()])
+            self.touched = {}
+
+    def flush(self) -> None:
+        """
+        Writes the pending last-used times of cache hits.
+        """
+        with self.lock:
+            self._write_touched()
+
+    def _store(self, entries: Dict[str, List[float]]) -> None:
+        """
+        Stores new embeddings and evicts the least recently used ones over max_entries.
+        """
+        now = time.time()
+        with self.lock:
+            with self.conn:
+                # A key stored meanwhile by another thread holds the same embedding
+                inserted = self.conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    [(key, array('f', vector).tobytes(), now) for key, vector in entries.items()]
+                ).rowcount
+            self.count += inserted
+            if self.count > self.max_entries:
+                # Evict on up-to-date recency, and recount in case another process wrote
+                self._write_touched()
+                with self.conn:
+                    (self.count,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+                    if self.count > self.max_entries:
+                        self.count -= self.conn.execute(
+                            "DELETE FROM embeddings WHERE key IN "
+                            "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                            (self.count - self.max_entries,)
+                        ).rowcount
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds documents, only sending texts missing from the cache to the underlying model.
+        A text repeated within the call is embedded, and counted as a hit or miss, once.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            List[List[float]]: The embeddings, in the same order as the texts.
+        """
+        keys = [self._key(text) for text in texts]
+        unique = dict(zip(keys, texts))
+        cached = self._lookup(list(unique))
+
+        missing = {key: text for key, text in unique.items() if key not in cached}
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self._store(computed)
+            cached.update(computed)
+
+        with self.lock:
+            self.hits += len(unique) - len(missing)
+            self.misses += len(missing)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query, served from the cache when the same text was embedded before.
+
+        Args:
+            text (str): The query to embed.
+
+        Returns:
+            List[float]: The embedding.
+        """
+        key = self._key(text)
+        cached = self._lookup([key])
+        hit = key in cached
+        with self.lock:
+            self.hits += hit
+            self.misses += not hit
+        if hit:
+            return cached[key]
+
+        vector = self.underlying.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the cache hit-rate metrics since the cache was opened.
+
+        Returns:
+            Dict[str, float]: The number of hits and misses and the hit rate.
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
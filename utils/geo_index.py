@@ -0,0 +1,142 @@
+# utils/geo_index.py
+
+# pylint: disable=E0401
+
+"""
+This module provides a spatial index over restaurant coordinates for radius ("near me",
+"near Little Tokyo") retrieval.
+
+Restaurants are bucketed in a grid of fixed-size latitude/longitude cells, so a radius
+query only measures the distance to the restaurants in the cells the circle overlaps.
+The matching place_ids are pushed into the vector query as a metadata filter, so ranking
+only sees restaurants that are actually close. The index is built during ingestion and
+saved as a JSON file of coordinates.
+
+Functions:
+- haversine_km: Returns the great-circle distance between two points.
+
+Classes:
+- GeoIndex: Grid index answering radius queries.
+"""
+
+import json
+import math
+import os
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Returns the great-circle distance between two points.
+
+    Args:
+        lat1 (float): Latitude of the first point, in degrees.
+        lng1 (float): Longitude of the first point, in degrees.
+        lat2 (float): Latitude of the second point, in degrees.
+        lng2 (float): Longitude of the second point, in degrees.
+
+    Returns:
+        float: The distance in kilometers.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = math.radians(lat2 - lat1), math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+class GeoIndex:
+    """
+    Grid index of restaurant coordinates answering radius queries.
+    """
+
+    def __init__(self, points: Dict[str, Tuple[float, float]], cell_degrees: float = 0.02):
+        """
+        Buckets the points in grid cells.
+
+        Args:
+            points (Dict[str, Tuple[float, float]]): (latitude, longitude) of every place_id.
+            cell_degrees (float): Size of a grid cell in degrees, about 2 km at 0.02.
+        """
+        self.points = points
+        self.cell_degrees = cell_degrees
+        self.cells = defaultdict(list)
+        for place_id, (lat, lng) in points.items():
+            self.cells[self._cell(lat, lng)].append(place_id)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        """
+        Returns the grid cell holding a point.
+        """
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    @classmethod
+    def from_metadata(cls, meta: List[Dict]) -> 'GeoIndex':
+        """
+        Builds an index over the restaurants whose metadata has coordinates.
+
+        Args:
+            meta (List[Dict]): Restaurant metadata with place_id, latitude and longitude.
+
+        Returns:
+            GeoIndex: The index.
+        """
+        return cls({m['place_id']: (m['latitude'], m['longitude']) for m in meta
+                    if m.get('latitude') is not None and m.get('longitude') is not None})
+
+    def save(self, path: str) -> None:
+        """
+        Writes the index to a JSON file.
+
+        Args:
+            path (str): Path to the index file.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'points': self.points, 'cell_degrees': self.cell_degrees}, file)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str) -> 'GeoIndex':
+        """
+        Reads an index written by save.
+
+        Args:
+            path (str): Path to the index file.
+
+        Returns:
+            GeoIndex: The index.
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        return cls({place_id: tuple(point) for place_id, point in data['points'].items()},
+                   data['cell_degrees'])
+
+    def within(self, lat: float, lng: float, radius_km: float) -> List[str]:
+        """
+        Returns the place_ids within a radius of a point, closest first.
+
+        Args:
+            lat (float): Latitude of the center, in degrees.
+            lng (float): Longitude of the center, in degrees.
+            radius_km (float): The radius in kilometers.
+
+        Returns:
+            List[str]: The place_ids inside the circle.
+        """
+        # Degrees spanned by the radius, longitude degrees shrink away from the equator
+        lat_span = math.degrees(radius_km / EARTH_RADIUS_KM)
+        lng_span = lat_span / max(math.cos(math.radians(lat)), 1e-6)
+        low_lat, low_lng = self._cell(lat - lat_span, lng - lng_span)
+        high_lat, high_lng = self._cell(lat + lat_span, lng + lng_span)
+
+        found = []
+        for cell_lat in range(low_lat, high_lat + 1):
+            for cell_lng in range(low_lng, high_lng + 1):
+                for place_id in self.cells.get((cell_lat, cell_lng), ()):
+                    distance = haversine_km(lat, lng, *self.points[place_id])
+                    if distance <= radius_km:
+                        found.append((distance, place_id))
+        return [place_id for _, place_id in sorted(found)]
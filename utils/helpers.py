@@ -10,32 +10,84 @@ This module provides utility functions for interacting with
 configuration files and initializing ChromaDB.
 
 Functions:
+- embeddings_init: Returns the OpenAI embeddings model behind the local embedding cache.
+- pinecone_init: Initializes the Pinecone client and sets up the index for restaurant data.
 - chromadb_init: Initializes the ChromaDB client and sets up the collection for restaurant data.
+- numpy_store_init: Initializes the in-process NumPy vector store for restaurant data.
 - generate_prompt: Generates a prompt based on the context and user query.
+- strip_prompt_context: Recovers the user query from a generated prompt.
 - format_docs: Formats documents with restaurant metadata and reviews.
-- documents_init: Summarizes restaurant data and returns the summarized documents and original data.
+- summary_inputs: Builds the summary prompt variables for a restaurant.
+- documents_init: Summarizes restaurant data concurrently and returns the summarized documents
+  and original data.
 - format_restaurant_data: Extracts and formats specific restaurant information.
-- split_documents_and_add_to_collection: Splits and adds documents and metadata 
-  to a ChromaDB collection.
+- document_content_hash: Hashes a document and its metadata for change detection.
+- existing_content_hashes: Fetches the content hashes stored in a vector store.
+- all_document_ids: Lists every document ID in a vector store.
+- all_documents: Fetches every document ID, text and metadata in a vector store.
+- upsert_embedded_documents: Writes already embedded documents to a vector store in batches.
+- vector_store_key: Identifies the backend and collection of a vector store.
+- read_checkpoint: Reads the documents already written to a store by an interrupted ingestion.
+- clear_checkpoint: Drops the checkpoint entries of a store once its ingestion completed.
+- split_documents_and_add_to_collection: Upserts new and changed documents and metadata,
+  keyed by place_id, into a Chroma, Pinecone or NumPy vector store in pipelined batches,
+  and rebuilds the lexical and spatial indexes.
 """
 
 
+import hashlib
 import json
 import os
+import threading
 import time
-from typing import List, Dict, Tuple
-from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
 import chromadb
+import openai
 from langchain_chroma import Chroma
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.prompts import PromptTemplate
 from langchain_pinecone import PineconeVectorStore
 from pinecone import Pinecone, ServerlessSpec
 from langchain_core.documents import Document
+from utils.dataset import batched, read_restaurants
+from utils.embedding_cache import CachedEmbeddings
+from utils.geo_index import GeoIndex
+from utils.lexical_index import BM25Index, lexical_text
+from utils.numpy_store import NumpyVectorStore
+from utils.query_filters import address_city, price_level_value
+from utils.summary_cache import SummaryCache, summary_cache_key
 
 OPEN_AI_API_KEY = os.getenv('OPENAI_API_KEY')
 PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_PATH = "backend/embedding_cache.sqlite3"
+EMBEDDING_CACHE_SIZE = 100000
+NUMPY_STORE_PATH = "backend/numpy_store"
+
+_embeddings_lock = threading.Lock()
+_embeddings = None
+
+def embeddings_init() -> CachedEmbeddings:
+    """
+    Returns the OpenAI embeddings model behind the process-wide local embedding cache,
+    shared by ingestion and query-time retrieval.
+
+    Returns:
+        CachedEmbeddings: The cached embeddings model.
+    """
+    global _embeddings  # pylint: disable=W0603
+    with _embeddings_lock:
+        if _embeddings is None:
+            _embeddings = CachedEmbeddings(
+                OpenAIEmbeddings(api_key=OPEN_AI_API_KEY, model=EMBEDDING_MODEL),
+                model=EMBEDDING_MODEL,
+                path=EMBEDDING_CACHE_PATH,
+                max_entries=EMBEDDING_CACHE_SIZE,
+            )
+    return _embeddings
+
 def pinecone_init(index_name: str) -> PineconeVectorStore:
     """
     Initializes the Pinecone client and sets up the collection for restaurant data.
@@ -47,9 +99,8 @@ def pinecone_init(index_name: str) -> PineconeVectorStore:
         PineconeVectorStore: The initialized Pinecone client.
     """
 
-    # Set up OpenAI embeddings model
-    embeddings_model = OpenAIEmbeddings(api_key=OPEN_AI_API_KEY,
-                                        model="text-embedding-3-small")
+    # Set up the cached OpenAI embeddings model
+    embeddings_model = embeddings_init()
 
     # configure client
     pc = Pinecone(api_key=PINECONE_API_KEY)
@@ -83,9 +134,8 @@ def chromadb_init() -> Chroma:
         Chroma: The initialized Chroma client.
     """
 
-    # Set up OpenAI embeddings model
-    embeddings_model = OpenAIEmbeddings(api_key=OPEN_AI_API_KEY,
-                                        model="text-embedding-3-small")
+    # Set up the cached OpenAI embeddings model
+    embeddings_model = embeddings_init()
 
     # Create or connect to a persistent ChromaDB client
     client = chromadb.PersistentClient(path="backend/chroma_db")
@@ -106,6 +156,23 @@ def chromadb_init() -> Chroma:
 
     return langchain_chroma
 
+def numpy_store_init(path: str = NUMPY_STORE_PATH) -> NumpyVectorStore:
+    """
+    Initializes the in-process NumPy vector store for restaurant data.
+
+    Args:
+        path (str): The directory holding the store files.
+
+    Returns:
+        NumpyVectorStore: The initialized NumPy vector store.
+    """
+    langchain_numpy = NumpyVectorStore(path, embeddings_init())
+
+    # Print the number of instances in the store
+    print(f'Number of instances in DB: {len(langchain_numpy.ids)} \n')
+
+    return langchain_numpy
+
 def generate_prompt(context, question):
     """Will add this in the future lol"""
     return f"""
@@ -115,6 +182,20 @@ def generate_prompt(context, question):
         User Query: {question}
         """.strip()
 
+def strip_prompt_context(prompt):
+    """
+    Reverses generate_prompt, dropping the retrieval context and keeping only the user query.
+
+    Args:
+        prompt (str): A prompt built by generate_prompt, or any other message content.
+
+    Returns:
+        str: The user query, or the content unchanged if it is not a generated prompt.
+    """
+    if not prompt.startswith('Context and metadata:') or 'User Query:' not in prompt:
+        return prompt
+    return prompt.rsplit('User Query:', 1)[1].strip()
+
 def format_docs(docs):
     """Will add this in the future lol"""
     res = ""
@@ -127,102 +208,396 @@ def format_docs(docs):
 
     return res
 
-def documents_init(path: str) -> Tuple[List[str], List[Dict]]:
+# Bump SUMMARY_PROMPT_VERSION whenever SUMMARY_TEMPLATE changes to invalidate cached summaries
+SUMMARY_PROMPT_VERSION = 1
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_CACHE_PATH = "backend/summary_cache.sqlite3"
+INGEST_CHECKPOINT_PATH = "backend/ingest_checkpoint.jsonl"
+LEXICAL_INDEX_PATH = "backend/lexical_index.json"
+GEO_INDEX_PATH = "backend/geo_index.json"
+
+SUMMARY_TEMPLATE = """
+    I will provide you with reviews/info of a restaurant. Please summarize these reviews in 1-3 sentences.
+
+    ### Must Include in the Summary:
+    - A comprehensive list of all the food items mentioned in the reviews (include every single food the restaurant serves).
+    - A general summary of how customers feel about the restaurant, reflecting the overall sentiment.
+    - Key pros of the restaurant as highlighted by the reviews.
+    - Key cons of the restaurant as highlighted by the reviews.
+    - Price range (if given)
+    - Key descriptions of the restaurant
+
+    ### Optional to Include in the Summary:
+    - Information about the vibe or environment of the restaurant, but only if the reviews mention it specifically.
+
+    ### Reviews:
+    {reviews}
+
+    ### Price:
+    {price}
+
+    ### Key Descriptions of Restaurant:
+    {keywords}
+"""
+
+def summary_inputs(restaurant: Dict) -> Dict[str, str]:
+    """
+    Builds the summary prompt variables for a restaurant.
+
+    Args:
+        restaurant (Dict): A restaurant entry with name, reviews, price_level and keywords.
+
+    Returns:
+        Dict[str, str]: The reviews, price and keywords prompt variables.
+    """
+    rev = f"Reviews for {restaurant['name']}: \n"
+    for review in restaurant['reviews']:
+        review = review.replace('\n\n', '').replace('\n', '')
+        review = review.replace('.', '.\n')
+        rev += f"{review}\n\n"
+
+    return {'reviews': rev, 'price': restaurant['price_level'],
+            'keywords': ', '.join(restaurant['keywords'])}
+
+def documents_init(path: str, max_concurrency: int = 8, max_retries: int = 3,
+                   cache_path: Optional[str] = SUMMARY_CACHE_PATH,
+                   chunk_size: int = 500) -> Tuple[List[str], List[Dict]]:
     """
     Generates summarized documents for each restaurant based on customer reviews.
+    Restaurants are summarized concurrently, rate-limit and connection errors are retried
+    with exponential backoff and jitter. Summaries are cached by a hash of their inputs,
+    so only new or changed restaurants are sent to the LLM.
+
+    The dataset is streamed `chunk_size` restaurants at a time and reviews are dropped
+    once summarized, so memory does not grow with the reviews of the whole dataset.
+    Restaurants are deduplicated by place_id (the first entry wins) before summarizing.
 
     Args:
-        path (str): Path to the JSON file containing restaurant data.
+        path (str): Path to the JSON Lines (or legacy JSON) restaurant dataset.
+        max_concurrency (int): Maximum number of summaries requested at the same time.
+        max_retries (int): Maximum number of attempts for every restaurant.
+        cache_path (Optional[str]): Path to the summary cache, None to disable caching.
+        chunk_size (int): Number of restaurants read and summarized at a time.
 
     Returns:
         Tuple[List[str], List[Dict]]: A tuple containing summarized documents 
-        and original restaurant data.
+        and original restaurant data without reviews. Restaurants that still fail after
+        retrying are left out.
     """
-    # Load restaurant JSON data
-    with open(path, 'r', encoding='utf-8') as file:
-        restaurant_data = json.load(file)
+    cache = SummaryCache(cache_path) if cache_path else None
+
+    # Create LLM chain, retried by with_retry only: client retries on top of it would
+    # multiply the attempts per restaurant
+    prompt = PromptTemplate.from_template(SUMMARY_TEMPLATE)
+    llm = ChatOpenAI(api_key=OPEN_AI_API_KEY, model=SUMMARY_MODEL, max_retries=0)
+    llm_chain = (prompt | llm).with_retry(
+        retry_if_exception_type=(openai.RateLimitError, openai.APIConnectionError,
+                                 openai.APITimeoutError, openai.InternalServerError),
+        wait_exponential_jitter=True,
+        stop_after_attempt=max_retries,
+    )
 
-    # Template to summarize the reviews of the restaurant
-    template = """
-        I will provide you with reviews/info of a restaurant. Please summarize these reviews in 1-3 sentences.
+    seen_ids, duplicates = set(), 0
+
+    def unique_restaurants():
+        """Yields the restaurants of the dataset, skipping repeated place_ids."""
+        nonlocal duplicates
+        for restaurant in read_restaurants(path):
+            if restaurant['place_id'] in seen_ids:
+                duplicates += 1
+                continue
+            seen_ids.add(restaurant['place_id'])
+            yield restaurant
+
+    summarized_documents, summarized_restaurants, total = [], [], 0
+    for restaurant_data in batched(unique_restaurants(), chunk_size):
+        # Look up the summaries of unchanged restaurants
+        keys = [summary_cache_key(restaurant, SUMMARY_PROMPT_VERSION, SUMMARY_MODEL)
+                for restaurant in restaurant_data]
+        summaries = cache.get_many(keys) if cache else {}
+        pending = [i for i, key in enumerate(keys) if key not in summaries]
+        print(f'{len(restaurant_data) - len(pending)} summaries cached, {len(pending)} to generate')
+
+        # Create docs for every new or changed restaurant with summarized reviews
+        print(f'Creating documents with reviews summarized ({max_concurrency} at a time)')
+        results = llm_chain.batch([summary_inputs(restaurant_data[i]) for i in pending],
+                                  config={'max_concurrency': max_concurrency},
+                                  return_exceptions=True) if pending else []
+
+        new_entries = []
+        for index, result in zip(pending, results):
+            restaurant = restaurant_data[index]
+            if isinstance(result, Exception):
+                print(f'Failed to summarize doc #{total + index} ({restaurant["name"]}): {result}')
+                continue
+            summaries[keys[index]] = result.content
+            new_entries.append((keys[index], restaurant['place_id'], result.content))
+
+        if cache:
+            cache.put_many(new_entries)
+
+        for key, restaurant in zip(keys, restaurant_data):
+            if key in summaries:
+                summarized_documents.append(summaries[key])
+                summarized_restaurants.append({k: v for k, v in restaurant.items()
+                                               if k != 'reviews'})
+        total += len(restaurant_data)
+
+    if cache:
+        cache.close()
+
+    if duplicates:
+        print(f'{duplicates} duplicated restaurants skipped')
+    print(f'{len(summarized_documents)}/{total} docs generated \n')
+    if summarized_documents:
+        print(f'Example first document: \n{summarized_documents[0]}')
+
+    return summarized_documents, summarized_restaurants
 
-        ### Must Include in the Summary:
-        - A comprehensive list of all the food items mentioned in the reviews (include every single food the restaurant serves).
-        - A general summary of how customers feel about the restaurant, reflecting the overall sentiment.
-        - Key pros of the restaurant as highlighted by the reviews.
-        - Key cons of the restaurant as highlighted by the reviews.
-        - Price range (if given)
-        - Key descriptions of the restaurant
+def format_restaurant_data(restaurant_data: List[Dict]) -> List[Dict]:
+    """
+    Formats restaurant data extracted from a JSON file.
 
-        ### Optional to Include in the Summary:
-        - Information about the vibe or environment of the restaurant, but only if the reviews mention it specifically.
+    The price level (1 to 4, 0 if unknown), keywords, city and, when the crawl captured them,
+    coordinates are kept so queries can be filtered on them. Keywords are joined into a string,
+    vector store metadata cannot hold lists nor nulls.
 
-        ### Reviews:
-        {reviews}
+    Args:
+        restaurant_data (List[Dict]): A list of dictionaries containing restaurant information.
 
-        ### Price:
-        {price}
+    Returns:
+        List[Dict]: A list of formatted dictionaries with selected restaurant information.
+    """
+    formatted = []
+    for restaurant in restaurant_data:
+        meta = {
+            "place_id": restaurant['place_id'],
+            "name": restaurant['name'],
+            "address": restaurant['address'],
+            "city": address_city(restaurant['address']),
+            "rating": restaurant['rating'],
+            "price_level": price_level_value(restaurant.get('price_level')),
+            "keywords": ', '.join(restaurant.get('keywords', [])),
+        }
+        if restaurant.get('latitude') is not None and restaurant.get('longitude') is not None:
+            meta["latitude"] = restaurant['latitude']
+            meta["longitude"] = restaurant['longitude']
+        formatted.append(meta)
+    return formatted
+
+def document_content_hash(doc: str, meta: Dict) -> str:
+    """
+    Hashes a document and its metadata, used to detect changed documents on re-indexing.
+
+    Args:
+        doc (str): The document text.
+        meta (Dict): The document metadata, without its content hash.
 
-        ### Key Descriptions of Restaurant:
-        {keywords}
+    Returns:
+        str: The hex SHA-256 digest of the document and metadata.
     """
+    payload = json.dumps([doc, meta], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
 
-    # Create LLM chain
-    prompt = PromptTemplate.from_template(template)
-    llm = ChatOpenAI(api_key=OPEN_AI_API_KEY, model="gpt-4o-mini")
-    llm_chain = prompt | llm
-    summarized_documents = []
+def existing_content_hashes(vector_store: object, ids: List[str]) -> Dict[str, str]:
+    """
+    Fetches the content hashes stored with the given document IDs.
 
-    # Create docs for every restaurant with summarized reviews
-    print('Creating documents with reviews summarized')
-    for index, restaurant in enumerate(restaurant_data):
-        name = restaurant['name']
-        price = restaurant['price_level']
-        keywords = ', '.join(restaurant['keywords'])
-        rev = f"Reviews for {name}: \n"
+    Args:
+        vector_store (object): A Chroma, Pinecone or NumPy vector store.
+        ids (List[str]): The document IDs to look up.
+
+    Returns:
+        Dict[str, str]: The stored content hash by document ID. Missing IDs are left out.
+    """
+    hashes = {}
+    for start in range(0, len(ids), 100):
+        batch = ids[start:start + 100]
+        if isinstance(vector_store, PineconeVectorStore):
+            vectors = vector_store._index.fetch(ids=batch).vectors  # pylint: disable=W0212
+            found = [(i, v.metadata or {}) for i, v in vectors.items()]
+        else:
+            result = vector_store.get(ids=batch, include=['metadatas'])
+            found = zip(result['ids'], result['metadatas'])
+        hashes.update({i: m['content_hash'] for i, m in found if m and 'content_hash' in m})
+    return hashes
+
+def all_document_ids(vector_store: object) -> List[str]:
+    """
+    Lists every document ID in the vector store.
 
-        for review in restaurant['reviews']:
-            review = review.replace('\n\n', '').replace('\n', '')
-            review = review.replace('.', '.\n')
-            rev += f"{review}\n\n"
+    Args:
+        vector_store (object): A Chroma, Pinecone or NumPy vector store.
 
-        rev_summary = llm_chain.invoke({'reviews': rev, 'price': price,
-                                        'keywords': keywords}).content
-        summarized_documents.append(rev_summary)
-        print(f'Summarized Doc #{index}')
+    Returns:
+        List[str]: The document IDs.
+    """
+    if isinstance(vector_store, PineconeVectorStore):
+        return [i for page in vector_store._index.list() for i in page]  # pylint: disable=W0212
+    return vector_store.get(include=[])['ids']
 
-    print('All docs generated \n')
-    print(f'Example first document: \n{summarized_documents[0]}')
+def all_documents(vector_store: object) -> Tuple[List[str], List[str], List[Dict]]:
+    """
+    Fetches every document in the vector store.
 
-    return summarized_documents, restaurant_data
+    Args:
+        vector_store (object): A Chroma, Pinecone or NumPy vector store.
 
-def format_restaurant_data(restaurant_data: List[Dict]) -> List[Dict]:
+    Returns:
+        Tuple[List[str], List[str], List[Dict]]: The document IDs, texts and metadata.
     """
-    Formats restaurant data extracted from a JSON file.
+    if isinstance(vector_store, PineconeVectorStore):
+        text_key = vector_store._text_key  # pylint: disable=W0212
+        ids, documents, metadatas = [], [], []
+        for page in vector_store._index.list():  # pylint: disable=W0212
+            vectors = vector_store._index.fetch(ids=page).vectors  # pylint: disable=W0212
+            for i, vector in vectors.items():
+                meta = dict(vector.metadata or {})
+                ids.append(i)
+                documents.append(meta.pop(text_key, ''))
+                metadatas.append(meta)
+        return ids, documents, metadatas
+    result = vector_store.get(include=['documents', 'metadatas'])
+    return result['ids'], result['documents'], result['metadatas']
+
+def upsert_embedded_documents(vector_store: object, ids: List[str], documents: List[Document],
+                              embeddings: List[List[float]], batch_size: int) -> None:
+    """
+    Writes already embedded documents to the vector store in batches.
 
     Args:
-        restaurant_data (List[Dict]): A list of dictionaries containing restaurant information.
+        vector_store (object): A Chroma, Pinecone or NumPy vector store.
+        ids (List[str]): The document IDs.
+        documents (List[Document]): The documents, in the same order as the IDs.
+        embeddings (List[List[float]]): The document embeddings, in the same order as the IDs.
+        batch_size (int): Maximum number of documents per upsert request.
+    """
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        batch = documents[start:end]
+        if isinstance(vector_store, NumpyVectorStore):
+            vector_store.upsert(ids[start:end], embeddings[start:end],
+                                [d.metadata for d in batch], [d.page_content for d in batch])
+        elif isinstance(vector_store, PineconeVectorStore):
+            text_key = vector_store._text_key  # pylint: disable=W0212
+            vector_store._index.upsert(vectors=[  # pylint: disable=W0212
+                (i, e, {**d.metadata, text_key: d.page_content})
+                for i, e, d in zip(ids[start:end], embeddings[start:end], batch)
+            ])
+        else:
+            vector_store._collection.upsert(  # pylint: disable=W0212
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=[d.metadata for d in batch],
+                documents=[d.page_content for d in batch],
+            )
+
+def vector_store_key(vector_store: object) -> str:
+    """
+    Identifies the backend and collection of a vector store, so the checkpoint entries of
+    ingestions into different stores never mix.
+
+    Args:
+        vector_store (object): A Chroma, Pinecone or NumPy vector store.
 
     Returns:
-        List[Dict]: A list of formatted dictionaries with selected restaurant information.
+        str: "<backend>:<collection>", e.g. "chroma:restaurant_collection_large".
+    """
+    if isinstance(vector_store, PineconeVectorStore):
+        config = getattr(vector_store._index, '_config', None)  # pylint: disable=W0212
+        namespace = getattr(vector_store, '_namespace', None) or ''
+        return f"pinecone:{getattr(config, 'host', '')}/{namespace}"
+    if isinstance(vector_store, NumpyVectorStore):
+        return f'numpy:{os.path.abspath(vector_store.path)}'
+    return f'chroma:{vector_store._collection.name}'  # pylint: disable=W0212
+
+def read_checkpoint(path: Optional[str], store_key: str) -> Dict[str, str]:
+    """
+    Reads the documents already written to a store by an interrupted ingestion.
+
+    Args:
+        path (Optional[str]): Path to the checkpoint file, None if checkpointing is disabled.
+        store_key (str): The vector_store_key of the store being written.
+
+    Returns:
+        Dict[str, str]: The written content hash by document ID.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    written = {}
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line may be cut short by a crash
+                continue
+            if entry.get('store') == store_key:
+                written[entry['id']] = entry['content_hash']
+    return written
+
+def clear_checkpoint(path: Optional[str], store_key: str) -> None:
     """
-    return [{
-        "place_id": restaurant['place_id'],
-        "name": restaurant['name'],
-        "address": restaurant['address'],
-        "rating": restaurant['rating'],
-    } for restaurant in restaurant_data]
+    Drops the checkpoint entries of a store once its ingestion completed, keeping the
+    entries of interrupted ingestions into other stores.
+
+    Args:
+        path (Optional[str]): Path to the checkpoint file, None if checkpointing is disabled.
+        store_key (str): The vector_store_key of the store that was written.
+    """
+    if not path or not os.path.exists(path):
+        return
+    kept = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get('store') not in (store_key, None):
+                kept.append(json.dumps(entry) + '\n')
+    if not kept:
+        os.remove(path)
+        return
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        file.writelines(kept)
+    os.replace(path + '.tmp', path)
 
 def split_documents_and_add_to_collection(docs: List[str], meta: List[Dict],
-                                          vector_store: object) -> None:
+                                          vector_store: object, prune: bool = False,
+                                          keep_ids: Iterable[str] = (),
+                                          embed_batch_size: int = 256,
+                                          upsert_batch_size: int = 100,
+                                          checkpoint_path: Optional[str] = INGEST_CHECKPOINT_PATH,
+                                          lexical_index_path: Optional[str] = LEXICAL_INDEX_PATH,
+                                          geo_index_path: Optional[str] = GEO_INDEX_PATH
+                                          ) -> None:
     """
-    Adds documents and their corresponding metadata to a ChromaDB collection.
+    Upserts documents and their corresponding metadata into a Chroma, Pinecone or NumPy
+    vector store.
+
+    Document IDs are the restaurants' place_ids, so re-running ingestion updates documents
+    in place instead of duplicating them, and unchanged documents are not re-embedded.
+    Documents are embedded in batches while the previous batch is being upserted, and every
+    written batch is recorded in a checkpoint file, keyed by store, so an interrupted run
+    resumes where it stopped.
+    The BM25 lexical index used for hybrid retrieval and the spatial index used for radius
+    queries are rebuilt over every document in the store once it is written and pruned, so
+    they also cover documents kept from earlier runs.
 
     Args:
         docs (List[str]): A list of documents containing summarized restaurant information.
         meta (List[Dict]): A list of metadata dictionaries corresponding to each document.
-        db_collection (chromadb.Collection): The ChromaDB collection for storing 
+        vector_store (object): The Chroma, Pinecone or NumPy vector store for storing
             documents and metadata.
+        prune (bool): Delete documents whose place_id is neither in `meta` nor in `keep_ids`.
+        keep_ids (Iterable[str]): place_ids never pruned, e.g. every restaurant of the dataset
+            so the ones whose summary failed this run keep their previous document.
+        embed_batch_size (int): Number of documents embedded per request.
+        upsert_batch_size (int): Number of documents written per upsert request.
+        checkpoint_path (Optional[str]): Path to the checkpoint file, None to disable checkpointing.
+        lexical_index_path (Optional[str]): Path to the lexical index file, None to skip it.
+        geo_index_path (Optional[str]): Path to the spatial index file, None to skip it.
     """
     if len(docs) != len(meta):
         print("ERROR: doc length does not equal metadata length")
@@ -230,11 +605,76 @@ def split_documents_and_add_to_collection(docs: List[str], meta: List[Dict],
 
     print('Adding data to DB')
 
-    documents_object_list = []
+    # Key documents by place_id, the last entry wins for duplicated restaurants
+    documents_by_id = {}
     for i, m in zip(docs, meta):
-        d = Document(page_content=i, metadata=m)
-        documents_object_list.append(d)
-
-    uuids = [str(uuid4()) for _ in range(len(documents_object_list))]
-
-    vector_store.add_documents(documents=documents_object_list, ids=uuids)
+        m = {**m, 'content_hash': document_content_hash(i, m)}
+        documents_by_id[m['place_id']] = Document(page_content=i, metadata=m)
+
+    # Skip documents written to this store by an interrupted run, then the ones already up to date
+    store_key = vector_store_key(vector_store)
+    checkpoint = read_checkpoint(checkpoint_path, store_key)
+    ids = [i for i in documents_by_id
+           if checkpoint.get(i) != documents_by_id[i].metadata['content_hash']]
+    stored_hashes = existing_content_hashes(vector_store, ids)
+    changed_ids = [i for i in ids
+                   if stored_hashes.get(i) != documents_by_id[i].metadata['content_hash']]
+    print(f'{len(changed_ids)} new or changed documents, '
+          f'{len(documents_by_id) - len(changed_ids)} unchanged')
+
+    checkpoint_dir = os.path.dirname(checkpoint_path) if checkpoint_path else ''
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def write_batch(batch_ids, embeddings):
+        """Upserts one embedded batch and records it in the checkpoint."""
+        batch = [documents_by_id[i] for i in batch_ids]
+        upsert_embedded_documents(vector_store, batch_ids, batch, embeddings, upsert_batch_size)
+        if checkpoint_path:
+            with open(checkpoint_path, 'a', encoding='utf-8') as file:
+                for d in batch:
+                    file.write(json.dumps({'store': store_key, 'id': d.metadata['place_id'],
+                                           'content_hash': d.metadata['content_hash']}) + '\n')
+        print(f'Upserted {len(batch_ids)} documents')
+
+    # Embed batch N + 1 while batch N is being upserted
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        pending_write = None
+        for start in range(0, len(changed_ids), embed_batch_size):
+            batch_ids = changed_ids[start:start + embed_batch_size]
+            embeddings = vector_store.embeddings.embed_documents(
+                [documents_by_id[i].page_content for i in batch_ids]
+            )
+            if pending_write:
+                pending_write.result()
+            pending_write = writer.submit(write_batch, batch_ids, embeddings)
+        if pending_write:
+            pending_write.result()
+
+    if prune:
+        keep = set(keep_ids)
+        stale_ids = [i for i in all_document_ids(vector_store)
+                     if i not in documents_by_id and i not in keep]
+        if stale_ids:
+            vector_store.delete(ids=stale_ids)
+        print(f'{len(stale_ids)} stale documents deleted')
+
+    # Indexes cover the whole store, including documents kept from earlier runs
+    if lexical_index_path or geo_index_path:
+        stored_ids, stored_docs, stored_meta = all_documents(vector_store)
+
+        if lexical_index_path:
+            index = BM25Index.build(
+                stored_ids,
+                [lexical_text(d, m or {}) for d, m in zip(stored_docs, stored_meta)]
+            )
+            index.save(lexical_index_path)
+            print(f'Lexical index of {len(stored_ids)} documents written to {lexical_index_path}')
+
+        if geo_index_path:
+            geo_index = GeoIndex.from_metadata([m for m in stored_meta if m and 'place_id' in m])
+            geo_index.save(geo_index_path)
+            print(f'Spatial index of {len(geo_index.points)} restaurants written to {geo_index_path}')
+
+    # The run completed, the next one into this store starts from its contents
+    clear_checkpoint(checkpoint_path, store_key)
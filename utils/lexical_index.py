@@ -0,0 +1,218 @@
+# utils/lexical_index.py
+
+# pylint: disable=E0401
+
+"""
+This module provides a BM25 lexical index over restaurant documents and hybrid retrieval
+that fuses it with dense vector search using reciprocal rank fusion (RRF).
+
+Dense embeddings often miss exact dish and neighborhood names ("xiao long bao", "Arcadia"),
+which the lexical index matches directly. The index is built during ingestion and saved as
+a JSON file holding the postings and document lengths, so serving never re-tokenizes the corpus.
+
+Functions:
+- tokenize: Splits text into lowercase word tokens.
+- lexical_text: Builds the indexed text of a restaurant document.
+- reciprocal_rank_fusion: Fuses several rankings of document IDs.
+- hybrid_search: Retrieves documents with both dense and lexical search.
+
+Classes:
+- BM25Index: Inverted index scored with Okapi BM25.
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase word tokens.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        List[str]: The tokens.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+def lexical_text(doc: str, meta: Dict) -> str:
+    """
+    Builds the indexed text of a restaurant: name, keywords, address and summary.
+
+    Args:
+        doc (str): The summarized restaurant document.
+        meta (Dict): The restaurant metadata.
+
+    Returns:
+        str: The text to index.
+    """
+    keywords = meta.get('keywords', '')
+    if isinstance(keywords, list):
+        keywords = ' '.join(keywords)
+    return ' '.join([str(meta.get('name', '')), keywords.replace('_', ' '),
+                     str(meta.get('address', '')), doc])
+
+class BM25Index:
+    """
+    Inverted index scored with Okapi BM25.
+    """
+
+    def __init__(self, ids: List[str], postings: Dict[str, List[Tuple[int, int]]],
+                 doc_lengths: List[int], k1: float = 1.5, b: float = 0.75):
+        """
+        Initializes the index from its postings. Use BM25Index.build or BM25Index.load.
+
+        Args:
+            ids (List[str]): The document IDs, indexed by document number.
+            postings (Dict[str, List[Tuple[int, int]]]): (document number, term frequency)
+                pairs for every term.
+            doc_lengths (List[int]): The number of tokens in every document.
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 document length normalization.
+        """
+        self.ids = ids
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        n = len(ids)
+        self.avg_length = sum(doc_lengths) / n if n else 0.0
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+                    for term, p in postings.items()}
+
+    @classmethod
+    def build(cls, ids: List[str], texts: List[str]) -> 'BM25Index':
+        """
+        Builds an index over the given documents.
+
+        Args:
+            ids (List[str]): The document IDs.
+            texts (List[str]): The document texts, in the same order as the IDs.
+
+        Returns:
+            BM25Index: The index.
+        """
+        postings = defaultdict(list)
+        doc_lengths = []
+        for number, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                postings[term].append((number, frequency))
+        return cls(list(ids), dict(postings), doc_lengths)
+
+    def save(self, path: str) -> None:
+        """
+        Writes the index to a JSON file.
+
+        Args:
+            path (str): Path to the index file.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'ids': self.ids, 'postings': self.postings,
+                       'doc_lengths': self.doc_lengths, 'k1': self.k1, 'b': self.b}, file)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        """
+        Reads an index written by save.
+
+        Args:
+            path (str): Path to the index file.
+
+        Returns:
+            BM25Index: The index.
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        return cls(data['ids'], data['postings'], data['doc_lengths'], data['k1'], data['b'])
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        """
+        Returns the k documents with the highest BM25 score for the query.
+
+        Args:
+            query (str): The query text.
+            k (int): The number of documents to return.
+
+        Returns:
+            List[Tuple[str, float]]: Document IDs and scores, best first.
+        """
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for number, frequency in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[number] / self.avg_length)
+                scores[number] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[number], score) for number, score in best]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """
+    Fuses several rankings of document IDs, scoring each ID by the sum of 1 / (k + rank).
+
+    Args:
+        rankings (List[List[str]]): Document IDs of every ranking, best first.
+        k (int): Dampens the weight of the top ranks.
+
+    Returns:
+        List[str]: The fused ranking, best first.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+def hybrid_search(vector_store: object, index: Optional[BM25Index], query: str,
+                  embedding: List[float], k: int = 5, candidates: int = 20,
+                  where: Optional[Dict] = None) -> List[Document]:
+    """
+    Retrieves documents with dense search and, when an index is given, BM25 search,
+    fused with reciprocal rank fusion.
+
+    Args:
+        vector_store (object): A Chroma or NumPy vector store keyed by place_id.
+        index (Optional[BM25Index]): The lexical index, None for dense search only.
+        query (str): The query text.
+        embedding (List[float]): The query embedding.
+        k (int): The number of documents to return.
+        candidates (int): The number of candidates taken from each search before fusion.
+        where (Optional[Dict]): A Chroma-style metadata filter applied to both searches
+            before ranking.
+
+    Returns:
+        List[Document]: The retrieved documents, best first.
+    """
+    if index is None:
+        return vector_store.similarity_search_by_vector(embedding, k=k, filter=where)
+
+    dense = vector_store.similarity_search_by_vector(embedding, k=candidates, filter=where)
+    docs_by_id = {doc.metadata['place_id']: doc for doc in dense}
+    lexical = [doc_id for doc_id, _ in index.search(query, candidates)]
+    if where and lexical:
+        # The index has no metadata, the vector store drops the non-matching candidates
+        allowed = set(vector_store.get(ids=lexical, where=where, include=[])['ids'])
+        lexical = [doc_id for doc_id in lexical if doc_id in allowed]
+    fused = reciprocal_rank_fusion([list(docs_by_id), lexical])[:k]
+
+    # Documents only found by the lexical index are fetched from the vector store
+    missing = [doc_id for doc_id in fused if doc_id not in docs_by_id]
+    if missing:
+        found = vector_store.get(ids=missing, include=['documents', 'metadatas'])
+        for doc_id, content, meta in zip(found['ids'], found['documents'], found['metadatas']):
+            docs_by_id[doc_id] = Document(page_content=content, metadata=meta)
+    return [docs_by_id[doc_id] for doc_id in fused if doc_id in docs_by_id]
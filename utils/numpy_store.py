@@ -0,0 +1,362 @@
+# utils/numpy_store.py
+
+# pylint: disable=E0401
+# pylint: disable=W0221
+
+"""
+This module provides an in-process vector store backed by NumPy, an alternative to Chroma
+and Pinecone for corpora small enough to fit in memory (a few thousand restaurants).
+
+Normalized float32 embeddings are kept in a memory-mapped .npy matrix and metadata in
+columnar lists, so a cosine top-k query is one matrix-vector product plus an argpartition.
+The `get`/`where` API mirrors Chroma's, so the helpers in utils/helpers.py work unchanged.
+
+Classes:
+- NumpyVectorStore: LangChain VectorStore over a memory-mapped embedding matrix.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales every row to unit length, leaving zero rows unchanged.
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store persisted as `vectors.npy` (embeddings) and `index.json`
+    (IDs, documents and metadata columns) in a directory.
+    """
+
+    def __init__(self, path: str, embedding: Embeddings):
+        """
+        Opens the store in `path`, creating an empty one if it does not exist.
+
+        Args:
+            path (str): The directory holding the store files.
+            embedding (Embeddings): The embeddings model used for texts and queries.
+        """
+        self.path = path
+        self._embedding = embedding
+        self.lock = threading.Lock()
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def _load(self) -> None:
+        """
+        Loads the store files, memory-mapping the embedding matrix.
+
+        Raises:
+            ValueError: If the embedding matrix and the index do not have the same rows.
+        """
+        index_path = os.path.join(self.path, 'index.json')
+        vectors_path = os.path.join(self.path, 'vectors.npy')
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+            self.ids = index['ids']
+            self.documents = index['documents']
+            self.columns = index['columns']
+            self.vectors = np.load(vectors_path, mmap_mode='r')
+            if self.vectors.shape[0] != len(self.ids):
+                raise ValueError(f"Vector store at {self.path} is corrupted: "
+                                 f"{self.vectors.shape[0]} vectors for {len(self.ids)} IDs")
+        else:
+            self.ids, self.documents, self.columns = [], [], {}
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.positions = {i: n for n, i in enumerate(self.ids)}
+        self.column_cache = {}
+
+    def _save(self, vectors: np.ndarray, ids: List[str], documents: List[str],
+              columns: Dict[str, List]) -> None:
+        """
+        Writes new store contents atomically, then switches the store over to them and
+        re-opens the embedding matrix as a memory map. The store is unchanged if writing fails.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        vectors_path = os.path.join(self.path, 'vectors.npy')
+        index_path = os.path.join(self.path, 'index.json')
+
+        with open(vectors_path + '.tmp', 'wb') as file:
+            np.save(file, vectors)
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'ids': ids, 'documents': documents, 'columns': columns},
+                      file, ensure_ascii=False)
+        os.replace(vectors_path + '.tmp', vectors_path)
+        os.replace(index_path + '.tmp', index_path)
+
+        self.ids, self.documents, self.columns = ids, documents, columns
+        self.vectors = np.load(vectors_path, mmap_mode='r')
+        self.positions = {i: n for n, i in enumerate(self.ids)}
+        self.column_cache = {}
+
+    def _metadata(self, position: int) -> Dict[str, Any]:
+        """
+        Rebuilds the metadata dictionary of a row from the columns.
+        """
+        return {key: column[position] for key, column in self.columns.items()
+                if column[position] is not None}
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]],
+               metadatas: List[Dict], documents: List[str]) -> None:
+        """
+        Inserts new documents and replaces the ones whose ID already exists. An ID repeated
+        within the call is written once, with its last document. The changes are made on
+        copies, so the store is left unchanged if the call fails.
+
+        Args:
+            ids (List[str]): The document IDs.
+            embeddings (List[List[float]]): The document embeddings.
+            metadatas (List[Dict]): The document metadata.
+            documents (List[str]): The document texts.
+
+        Raises:
+            ValueError: If the embeddings do not have the dimension of the stored ones.
+        """
+        new_vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        # Deduplicate first, the last entry of a repeated ID wins
+        batch = {i: (vector, meta, doc) for i, vector, meta, doc
+                 in zip(ids, new_vectors, metadatas, documents)}
+        with self.lock:
+            dimension = self.vectors.shape[1] if len(self.ids) else new_vectors.shape[-1]
+            if new_vectors.ndim != 2 or new_vectors.shape[1] != dimension:
+                raise ValueError(f"Expected embeddings of dimension {dimension}, "
+                                 f"got an array of shape {new_vectors.shape}")
+            vectors = np.array(self.vectors) if len(self.ids) else \
+                np.zeros((0, dimension), dtype=np.float32)
+            new_ids, new_documents = list(self.ids), list(self.documents)
+            columns = {key: list(column) for key, column in self.columns.items()}
+            positions = dict(self.positions)
+            appended = []
+            for i, (vector, meta, doc) in batch.items():
+                position = positions.get(i)
+                if position is None:
+                    position = len(new_ids)
+                    positions[i] = position
+                    new_ids.append(i)
+                    new_documents.append(doc)
+                    for column in columns.values():
+                        column.append(None)
+                    appended.append(vector)
+                else:
+                    new_documents[position] = doc
+                    vectors[position] = vector
+                for key, value in meta.items():
+                    column = columns.setdefault(key, [None] * len(new_ids))
+                    column[position] = value
+                for key, column in columns.items():
+                    if key not in meta:
+                        column[position] = None
+            if appended:
+                vectors = np.vstack([vectors, np.stack(appended)])
+            self._save(vectors, new_ids, new_documents, columns)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[Dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """
+        Embeds and upserts texts.
+
+        Args:
+            texts (Iterable[str]): The texts to add.
+            metadatas (Optional[List[Dict]]): The metadata of every text.
+            ids (Optional[List[str]]): The IDs of every text, random UUIDs if not given.
+
+        Returns:
+            List[str]: The IDs of the added texts.
+        """
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        self.upsert(ids, self._embedding.embed_documents(texts), metadatas, texts)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Deletes documents by ID.
+
+        Args:
+            ids (Optional[List[str]]): The IDs to delete.
+
+        Returns:
+            Optional[bool]: True once the documents are deleted.
+        """
+        with self.lock:
+            drop = {self.positions[i] for i in ids or [] if i in self.positions}
+            if not drop:
+                return True
+            keep = [n for n in range(len(self.ids)) if n not in drop]
+            vectors = np.array(self.vectors[keep]) if keep else \
+                np.zeros((0, self.vectors.shape[1]), dtype=np.float32)
+            self._save(vectors, [self.ids[n] for n in keep], [self.documents[n] for n in keep],
+                       {key: [column[n] for n in keep] for key, column in self.columns.items()})
+        return True
+
+    def _column(self, key: str, numeric: bool = False) -> np.ndarray:
+        """
+        Returns a metadata column as an array, as float64 with NaN for non-numbers if `numeric`.
+        """
+        cache_key = (key, numeric)
+        if cache_key not in self.column_cache:
+            values = self.columns.get(key, [None] * len(self.ids))
+            if numeric:
+                column = np.array([v if isinstance(v, (int, float)) and not isinstance(v, bool)
+                                   else np.nan for v in values], dtype=np.float64)
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+            self.column_cache[cache_key] = column
+        return self.column_cache[cache_key]
+
+    def _mask(self, where: Dict) -> np.ndarray:
+        """
+        Evaluates a Chroma-style `where` filter into a boolean row mask.
+        Supports $and, $or, $eq, $ne, $in, $nin, $gt, $gte, $lt and $lte.
+
+        Raises:
+            ValueError: If the filter uses an unsupported operator.
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in where.items():
+            if key == '$and':
+                for sub in condition:
+                    mask &= self._mask(sub)
+                continue
+            if key == '$or':
+                any_mask = np.zeros(len(self.ids), dtype=bool)
+                for sub in condition:
+                    any_mask |= self._mask(sub)
+                mask &= any_mask
+                continue
+            if not isinstance(condition, dict):
+                condition = {'$eq': condition}
+            for op, value in condition.items():
+                if op in ('$gt', '$gte', '$lt', '$lte'):
+                    column = self._column(key, numeric=True)
+                    with np.errstate(invalid='ignore'):
+                        mask &= {'$gt': column > value, '$gte': column >= value,
+                                 '$lt': column < value, '$lte': column <= value}[op]
+                elif op in ('$eq', '$ne', '$in', '$nin'):
+                    values = {value} if op in ('$eq', '$ne') else set(value)
+                    hits = np.fromiter((v in values for v in self._column(key)),
+                                       dtype=bool, count=len(self.ids))
+                    mask &= hits if op in ('$eq', '$in') else ~hits
+                else:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+        return mask
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, List]:
+        """
+        Fetches documents by ID and/or metadata filter, in the same format as Chroma's `get`.
+
+        Args:
+            ids (Optional[List[str]]): The IDs to fetch, every document if not given.
+            where (Optional[Dict]): A Chroma-style metadata filter.
+            include (Optional[List[str]]): Any of "documents" and "metadatas", both if not given.
+
+        Returns:
+            Dict[str, List]: The matching "ids", "documents" and "metadatas".
+        """
+        include = ['documents', 'metadatas'] if include is None else include
+        with self.lock:
+            if ids is not None:
+                positions = [self.positions[i] for i in ids if i in self.positions]
+            else:
+                positions = list(range(len(self.ids)))
+            if where:
+                mask = self._mask(where)
+                positions = [n for n in positions if mask[n]]
+            return {
+                'ids': [self.ids[n] for n in positions],
+                'documents': [self.documents[n] for n in positions]
+                             if 'documents' in include else None,
+                'metadatas': [self._metadata(n) for n in positions]
+                             if 'metadatas' in include else None,
+            }
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict] = None,  # pylint: disable=W0622
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Returns the k documents most similar to an embedding with their cosine similarity.
+
+        Args:
+            embedding (List[float]): The query embedding.
+            k (int): The number of documents to return.
+            filter (Optional[Dict]): A Chroma-style metadata filter applied before ranking.
+
+        Returns:
+            List[Tuple[Document, float]]: The documents and scores, most similar first.
+        """
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        with self.lock:
+            if not self.ids:
+                return []
+            scores = self.vectors @ query
+            if filter:
+                scores = np.where(self._mask(filter), scores, -np.inf)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(Document(page_content=self.documents[n], metadata=self._metadata(n)),
+                     float(scores[n])) for n in top if scores[n] != -np.inf]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict] = None,  # pylint: disable=W0622
+                                    **kwargs: Any) -> List[Document]:
+        """
+        Returns the k documents most similar to an embedding.
+        """
+        return [doc for doc, _ in
+                self.similarity_search_with_score_by_vector(embedding, k, filter=filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict] = None,  # pylint: disable=W0622
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Returns the k documents most similar to a query with their cosine similarity.
+        """
+        return self.similarity_search_with_score_by_vector(
+            self._embedding.embed_query(query), k, filter=filter)
+
+    def similarity_search(self, query: str, k: int = 4,
+                          filter: Optional[Dict] = None,  # pylint: disable=W0622
+                          **kwargs: Any) -> List[Document]:
+        """
+        Returns the k documents most similar to a query.
+        """
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k,
+                                                filter=filter)
+
+    def _select_relevance_score_fn(self):
+        """
+        Maps cosine similarity in [-1, 1] to a relevance score in [0, 1].
+        """
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings,
+                   metadatas: Optional[List[Dict]] = None, ids: Optional[List[str]] = None,
+                   path: str = 'backend/numpy_store', **kwargs: Any) -> 'NumpyVectorStore':
+        """
+        Creates or opens a store in `path` and adds the texts to it.
+
+        Returns:
+            NumpyVectorStore: The store.
+        """
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
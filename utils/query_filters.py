@@ -0,0 +1,219 @@
+# utils/query_filters.py
+
+# pylint: disable=E0401
+
+"""
+This module extracts structured metadata filters from user queries, so retrieval only ranks
+restaurants that can satisfy them ("cheap", "in Koreatown", "4.5+ stars").
+
+Filters are returned in the Chroma `where` syntax, which Pinecone and the NumPy store also
+accept, and are pushed down into the vector query's `filter` argument.
+
+Functions:
+- price_level_value: Converts a Google Places price level to a number.
+- address_city: Extracts the city from a formatted address.
+- is_follow_up: Checks whether a query asks about restaurants already recommended.
+- parse_query_filters: Extracts the metadata filter of a user query.
+- parse_query_location: Extracts the point and radius of a location query.
+- combine_filters: Combines metadata filters with $and.
+"""
+
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+# Google Places price levels, 0 for restaurants without one
+PRICE_LEVELS = {
+    'PRICE_LEVEL_INEXPENSIVE': 1,
+    'PRICE_LEVEL_MODERATE': 2,
+    'PRICE_LEVEL_EXPENSIVE': 3,
+    'PRICE_LEVEL_VERY_EXPENSIVE': 4,
+}
+
+# Neighborhoods people ask for, mapped to the city in their addresses
+NEIGHBORHOODS = {
+    'koreatown': 'Los Angeles',
+    'k-town': 'Los Angeles',
+    'ktown': 'Los Angeles',
+    'little tokyo': 'Los Angeles',
+    'downtown la': 'Los Angeles',
+    'dtla': 'Los Angeles',
+    'weho': 'West Hollywood',
+}
+
+# Centers of the places people ask to be near, as (latitude, longitude)
+LANDMARKS = {
+    'little tokyo': (34.0502, -118.2401),
+    'koreatown': (34.0618, -118.3004),
+    'k-town': (34.0618, -118.3004),
+    'ktown': (34.0618, -118.3004),
+    'downtown la': (34.0407, -118.2468),
+    'dtla': (34.0407, -118.2468),
+    'santa monica pier': (34.0094, -118.4973),
+    'third street promenade': (34.0162, -118.4962),
+    'rodeo drive': (34.0674, -118.4004),
+    'the grove': (34.0722, -118.3574),
+    'uci': (33.6405, -117.8443),
+}
+DEFAULT_RADIUS_KM = 2.0
+MILE_KM = 1.609
+
+NEAR_ME_PATTERN = re.compile(r"\b(near me|nearby|close to me|around me|close by|walking distance)\b")
+RADIUS_PATTERN = re.compile(r"\bwithin\s+(\d+(?:\.\d+)?)\s*(km|kilometers?|kilometres?|mi|miles?)\b")
+
+CHEAP_PATTERN = re.compile(
+    r"\b(cheap|inexpensive|affordable|budget|not (?:too |very |that )?(?:expensive|pricey))\b"
+)
+PRICEY_PATTERN = re.compile(r"\b(expensive|pricey|upscale|fancy|fine dining|high[- ]end|splurge)\b")
+# Restaurants without a price level (0) are kept by both price filters
+CHEAP_PRICE_LEVELS = [0, 1, 2]
+PRICEY_PRICE_LEVELS = [0, 3, 4]
+
+# Minimum ratings are only read next to star or rating wording, so "a table for 2+" is not one
+RATING = r"([1-5](?:\.\d)?)"
+OR_MORE = r"(?:and|or)\s+(?:up|above|higher|better|more)\b"
+RATING_PATTERNS = (
+    # "4.5+ stars", "4 stars and up", "4.5 star rating or higher"
+    re.compile(rf"\b{RATING}\s*(?:\+\s*(?:stars?|rat(?:ed|ings?))\b|stars?\s+(?:rating\s+)?{OR_MORE})"),
+    # "rated 4.5 or higher", "rating 4+", "ratings of 4.5 and up"
+    re.compile(rf"\b(?:rated|ratings?)\s+(?:of\s+)?{RATING}\s*(?:\+|(?:stars?\s+)?{OR_MORE})"),
+    # "rated at least 4", "at least 4.5 stars", "a rating above 4"
+    re.compile(rf"\b(?:rated|ratings?)\s+(?:of\s+)?(?:at least|above|over)\s+{RATING}\b"),
+    re.compile(rf"\b(?:at least|above|over)\s+{RATING}\s*\+?\s*stars?\b"),
+)
+
+# Questions about restaurants already recommended refer back to them ("is it expensive?",
+# "do they take reservations?"), they are not searches
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|they|them|their|those|these|that one|this one|that place|this place"
+    r"|either of|both of)\b"
+)
+STATE_ZIP_PATTERN = re.compile(r"^[A-Z]{2} \d{5}")
+
+def price_level_value(price_level: Optional[str]) -> int:
+    """
+    Converts a Google Places price level to a number.
+
+    Args:
+        price_level (Optional[str]): The price level, e.g. "PRICE_LEVEL_MODERATE".
+
+    Returns:
+        int: 1 (inexpensive) to 4 (very expensive), 0 if unknown.
+    """
+    return PRICE_LEVELS.get(price_level, 0)
+
+def address_city(address: str) -> str:
+    """
+    Extracts the city from a formatted address such as "233 E Huntington Dr, Arcadia, CA 91006, USA".
+
+    Args:
+        address (str): The formatted address.
+
+    Returns:
+        str: The city, or an empty string if the address has no "<state> <zip>" part.
+    """
+    parts = [part.strip() for part in address.split(',')]
+    for i, part in enumerate(parts):
+        if i and STATE_ZIP_PATTERN.match(part):
+            return parts[i - 1]
+    return ''
+
+def is_follow_up(query: str) -> bool:
+    """
+    Checks whether a query asks about restaurants already recommended rather than
+    searching for new ones, so its wording must not become a metadata filter.
+
+    Args:
+        query (str): The raw user query.
+
+    Returns:
+        bool: True if the query refers back to earlier recommendations.
+    """
+    return bool(FOLLOW_UP_PATTERN.search(query.lower()))
+
+def parse_query_filters(query: str, cities: Iterable[str] = ()) -> Optional[Dict]:
+    """
+    Extracts price, city and minimum rating filters from a user query. Price filters keep
+    the restaurants whose price level is unknown.
+
+    Args:
+        query (str): The raw user query.
+        cities (Iterable[str]): The cities present in the vector store.
+
+    Returns:
+        Optional[Dict]: A Chroma-style metadata filter, None if the query has no filters.
+    """
+    text = query.lower()
+    conditions = []
+
+    if CHEAP_PATTERN.search(text):
+        conditions.append({'price_level': {'$in': CHEAP_PRICE_LEVELS}})
+    elif PRICEY_PATTERN.search(text):
+        conditions.append({'price_level': {'$in': PRICEY_PRICE_LEVELS}})
+
+    # Longest names first, so "West Hollywood" wins over "Hollywood"
+    places = {city.lower(): city for city in cities if city}
+    places.update((name, city) for name, city in NEIGHBORHOODS.items() if city in places.values())
+    for name in sorted(places, key=len, reverse=True):
+        if re.search(rf"\b{re.escape(name)}\b", text):
+            conditions.append({'city': {'$eq': places[name]}})
+            break
+
+    for pattern in RATING_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            conditions.append({'rating': {'$gte': float(match.group(1))}})
+            break
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+def parse_query_location(query: str, user_location: Optional[Tuple[float, float]] = None,
+                         default_radius_km: float = DEFAULT_RADIUS_KM
+                         ) -> Optional[Tuple[float, float, float]]:
+    """
+    Extracts the point and radius of a location query: a known landmark ("near Little Tokyo"),
+    or the user's own location ("near me", "within 1 mile") when the request carries it.
+
+    Args:
+        query (str): The raw user query.
+        user_location (Optional[Tuple[float, float]]): The user's (latitude, longitude).
+        default_radius_km (float): The radius used when the query does not give one.
+
+    Returns:
+        Optional[Tuple[float, float, float]]: Latitude, longitude and radius in kilometers,
+        None if the query is not about a location.
+    """
+    text = query.lower()
+    radius = RADIUS_PATTERN.search(text)
+    radius_km = default_radius_km
+    if radius:
+        radius_km = float(radius.group(1)) * (MILE_KM if radius.group(2).startswith('mi') else 1)
+    elif 'walking distance' in text:
+        radius_km = 1.0
+
+    # Longest names first, so "santa monica pier" is not read as another landmark
+    for name in sorted(LANDMARKS, key=len, reverse=True):
+        if re.search(rf"\b{re.escape(name)}\b", text):
+            return (*LANDMARKS[name], radius_km)
+    if user_location and (radius or NEAR_ME_PATTERN.search(text)):
+        return (*user_location, radius_km)
+    return None
+
+def combine_filters(*filters: Optional[Dict]) -> Optional[Dict]:
+    """
+    Combines metadata filters with $and, ignoring missing ones.
+
+    Args:
+        *filters (Optional[Dict]): Chroma-style metadata filters.
+
+    Returns:
+        Optional[Dict]: The combined filter, None if every filter is missing.
+    """
+    conditions = []
+    for where in filters:
+        if where:
+            conditions.extend(where['$and'] if list(where) == ['$and'] else [where])
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
@@ -0,0 +1,108 @@
+# utils/summary_cache.py
+
+# pylint: disable=E0401
+
+"""
+This module provides a persistent, content-addressed cache for restaurant review summaries.
+
+Summaries are keyed by a hash of everything that affects them (place ID, reviews, price,
+keywords, prompt version and model), so re-indexing only pays for restaurants that changed.
+
+Functions:
+- summary_cache_key: Hashes the inputs of a summary into a cache key.
+
+Classes:
+- SummaryCache: SQLite-backed mapping from cache keys to summaries.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable
+
+def summary_cache_key(restaurant: Dict, prompt_version: int, model: str) -> str:
+    """
+    Hashes the inputs of a summary into a cache key.
+
+    Args:
+        restaurant (Dict): A restaurant entry with place_id, reviews, price_level and keywords.
+        prompt_version (int): The version of the summary prompt.
+        model (str): The model used to summarize.
+
+    Returns:
+        str: The hex SHA-256 digest of the summary inputs.
+    """
+    payload = json.dumps([
+        restaurant['place_id'],
+        restaurant['reviews'],
+        restaurant['price_level'],
+        restaurant['keywords'],
+        prompt_version,
+        model,
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class SummaryCache:
+    """
+    SQLite-backed mapping from summary cache keys to summaries.
+    """
+
+    def __init__(self, path: str):
+        """
+        Opens or creates the cache database.
+
+        Args:
+            path (str): Path to the SQLite file.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, place_id TEXT, summary TEXT NOT NULL, "
+            "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self.conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """
+        Looks up the summaries for the given keys.
+
+        Args:
+            keys (Iterable[str]): The cache keys to look up.
+
+        Returns:
+            Dict[str, str]: The cached summaries by key. Missing keys are left out.
+        """
+        keys = list(keys)
+        found = {}
+        # Stay under SQLite's limit on the number of bound parameters
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT key, summary FROM summaries WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            found.update(rows)
+        return found
+
+    def put_many(self, entries: Iterable[tuple]) -> None:
+        """
+        Stores summaries in the cache.
+
+        Args:
+            entries (Iterable[tuple]): (key, place_id, summary) tuples.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO summaries (key, place_id, summary) VALUES (?, ?, ?)",
+                entries
+            )
+
+    def close(self) -> None:
+        """
+        Closes the cache database.
+        """
+        self.conn.close()
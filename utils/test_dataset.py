@@ -0,0 +1,65 @@
+# pylint: disable=E0401
+# pylint: disable=C0114
+
+import json
+import os
+import tempfile
+from unittest import TestCase, skipUnless
+from utils.dataset import batched, export_parquet, read_restaurants, write_restaurants
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+class DatasetTests(TestCase):
+    """
+    Checks that restaurant datasets round-trip through JSON Lines and stream in batches.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.restaurants = [
+            {'place_id': 'p1', 'name': 'Daikokuya', 'rating': 4.4, 'reviews': ['Rich broth']},
+            {'place_id': 'p2', 'name': 'Café Dulce', 'rating': 'Unknown', 'reviews': []},
+        ]
+
+    def test_round_trips_through_json_lines(self):
+        path = os.path.join(self.directory, 'data', 'restaurants.jsonl')
+        self.assertEqual(write_restaurants(path, iter(self.restaurants)), 2)
+        self.assertEqual(list(read_restaurants(path)), self.restaurants)
+        self.assertFalse(os.path.exists(path + '.tmp'))
+        with open(path, encoding='utf-8') as file:
+            self.assertIn('Café Dulce', file.read())
+
+    def test_reads_legacy_json_and_skips_blank_lines(self):
+        legacy_path = os.path.join(self.directory, 'restaurants.json')
+        with open(legacy_path, 'w', encoding='utf-8') as file:
+            json.dump(self.restaurants, file)
+        self.assertEqual(list(read_restaurants(legacy_path)), self.restaurants)
+
+        path = os.path.join(self.directory, 'restaurants.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(json.dumps(r) for r in self.restaurants) + '\n\n')
+        self.assertEqual(list(read_restaurants(path)), self.restaurants)
+
+    def test_rewrite_replaces_the_dataset(self):
+        path = os.path.join(self.directory, 'restaurants.jsonl')
+        write_restaurants(path, self.restaurants)
+        write_restaurants(path, self.restaurants[1:])
+        self.assertEqual(list(read_restaurants(path)), self.restaurants[1:])
+
+    def test_batched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(batched([], 2)), [])
+
+    @skipUnless(pq, 'pyarrow is not installed')
+    def test_parquet_export_nulls_unknown_numbers(self):
+        path = os.path.join(self.directory, 'restaurants.jsonl')
+        parquet_path = os.path.join(self.directory, 'restaurants.parquet')
+        write_restaurants(path, self.restaurants)
+        self.assertEqual(export_parquet(path, parquet_path, batch_size=1), 2)
+        self.assertEqual(pq.read_table(parquet_path).column('rating').to_pylist(), [4.4, None])
@@ -0,0 +1,86 @@
+# pylint: disable=E0401
+# pylint: disable=C0114
+
+import itertools
+import os
+import tempfile
+from unittest import TestCase, mock
+from langchain_core.embeddings import Embeddings
+from utils.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """
+    Embeds texts as their length and records every text sent to the model.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class CachedEmbeddingsTests(TestCase):
+    """
+    Checks hits, misses, deduplication and LRU eviction of the embedding cache.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'embedding_cache.sqlite3')
+        self.model = CountingEmbeddings()
+        # Every call to time.time() is one tick later, so last-used times never tie
+        patcher = mock.patch('utils.embedding_cache.time')
+        patcher.start().time.side_effect = itertools.count(1)
+        self.addCleanup(patcher.stop)
+
+    def open(self, **kwargs):
+        cache = CachedEmbeddings(self.model, 'test-model', self.path, **kwargs)
+        self.addCleanup(cache.conn.close)
+        return cache
+
+    def test_repeated_texts_skip_the_model(self):
+        cache = self.open()
+        self.assertEqual(cache.embed_documents(['ramen', 'tacos']), [[5.0, 1.0], [5.0, 1.0]])
+        self.assertEqual(cache.embed_query('ramen'), [5.0, 1.0])
+        self.assertEqual(self.open().embed_documents(['tacos']), [[5.0, 1.0]])
+        self.assertEqual(self.model.calls, ['ramen', 'tacos'])
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'hit_rate': 1 / 3})
+
+    def test_duplicates_within_a_call_are_embedded_once(self):
+        cache = self.open()
+        self.assertEqual(cache.embed_documents(['x', 'x', 'yy']), [[1.0, 1.0], [1.0, 1.0], [2.0, 1.0]])
+        self.assertEqual(self.model.calls, ['x', 'yy'])
+        self.assertEqual((cache.hits, cache.misses, cache.count), (0, 2, 2))
+
+    def test_hits_write_last_used_times_in_batches(self):
+        cache = self.open(touch_batch_size=3)
+        cache.embed_documents(['a', 'b', 'c'])
+        changes = cache.conn.total_changes
+        cache.embed_query('a')
+        cache.embed_query('b')
+        self.assertEqual(cache.conn.total_changes, changes)
+        cache.embed_query('c')
+        self.assertEqual(cache.conn.total_changes, changes + 3)
+
+    def test_evicts_least_recently_used(self):
+        cache = self.open(max_entries=2)
+        cache.embed_query('a')
+        cache.embed_query('b')
+        cache.embed_query('a')  # a is now used more recently than b, but not written yet
+        cache.embed_query('c')
+        self.assertEqual(cache.count, 2)
+        self.assertEqual(self.open().count, 2)
+
+        self.model.calls = []
+        cache.embed_query('a')
+        cache.embed_query('c')
+        self.assertEqual(self.model.calls, [])
+        cache.embed_query('b')
+        self.assertEqual(self.model.calls, ['b'])
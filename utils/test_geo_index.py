@@ -0,0 +1,39 @@
+# pylint: disable=E0401
+# pylint: disable=C0114
+
+import os
+import tempfile
+from unittest import TestCase
+from utils.geo_index import GeoIndex, haversine_km
+
+
+class GeoIndexTests(TestCase):
+    """
+    Checks radius queries over the spatial index.
+    """
+
+    def setUp(self):
+        self.index = GeoIndex.from_metadata([
+            {'place_id': 'little_tokyo', 'latitude': 34.0505, 'longitude': -118.2405},
+            {'place_id': 'arts_district', 'latitude': 34.0410, 'longitude': -118.2330},
+            {'place_id': 'santa_monica', 'latitude': 34.0100, 'longitude': -118.4960},
+            {'place_id': 'no_location'},
+        ])
+
+    def test_haversine(self):
+        self.assertAlmostEqual(haversine_km(34.0502, -118.2401, 34.0094, -118.4973), 24.1, places=1)
+
+    def test_within_radius_closest_first(self):
+        self.assertEqual(self.index.within(34.0502, -118.2401, 2.0),
+                         ['little_tokyo', 'arts_district'])
+        self.assertEqual(self.index.within(34.0502, -118.2401, 0.5), ['little_tokyo'])
+
+    def test_nothing_within_radius(self):
+        self.assertEqual(self.index.within(33.6846, -117.8265, 2.0), [])
+
+    def test_round_trips_through_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'geo_index.json')
+            self.index.save(path)
+            loaded = GeoIndex.load(path)
+        self.assertEqual(loaded.within(34.01, -118.49, 1.0), ['santa_monica'])
@@ -0,0 +1,179 @@
+# pylint: disable=E0401
+# pylint: disable=C0114
+
+import os
+import tempfile
+from unittest import TestCase, mock
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from utils import helpers
+from utils.dataset import write_restaurants
+from utils.geo_index import GeoIndex
+from utils.lexical_index import BM25Index
+from utils.numpy_store import NumpyVectorStore
+
+
+def make_restaurant(n, **fields):
+    """Builds a restaurant dataset entry."""
+    return {'place_id': f'p{n}', 'name': f'Restaurant {n}',
+            'address': f'{n} Sawtelle Blvd, Los Angeles, CA 90025, USA', 'rating': 4.5,
+            'price_level': 'PRICE_LEVEL_MODERATE', 'keywords': ['ramen'],
+            'reviews': [f'Great tonkotsu ramen {n}'], **fields}
+
+
+class DocumentsInitTests(TestCase):
+    """
+    Checks that review summaries are cached by content hash, so only new or changed
+    restaurants are sent to the LLM.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dataset_path = os.path.join(directory.name, 'restaurants.jsonl')
+        self.cache_path = os.path.join(directory.name, 'summary_cache.sqlite3')
+        self.restaurants = [make_restaurant(n) for n in range(3)]
+        self.prompts = []
+
+        def summarize(prompt):
+            self.prompts.append(prompt.to_string())
+            return AIMessage(content=f'summary {len(self.prompts)}')
+
+        patcher = mock.patch.object(helpers, 'ChatOpenAI', return_value=RunnableLambda(summarize))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def summarize(self):
+        """Writes the dataset and returns its summaries."""
+        write_restaurants(self.dataset_path, self.restaurants)
+        docs, _ = helpers.documents_init(self.dataset_path, cache_path=self.cache_path)
+        return docs
+
+    def test_unchanged_restaurants_skip_the_llm(self):
+        first = self.summarize()
+        self.assertEqual(len(self.prompts), 3)
+        self.assertEqual(self.summarize(), first)
+        self.assertEqual(len(self.prompts), 3)
+
+    def test_changed_reviews_miss_the_cache(self):
+        first = self.summarize()
+        self.restaurants[1]['reviews'] = ['The broth got saltier']
+        second = self.summarize()
+        self.assertEqual(len(self.prompts), 4)
+        self.assertIn('The broth got saltier', self.prompts[-1])
+        self.assertEqual((second[0], second[2]), (first[0], first[2]))
+        self.assertEqual(second[1], 'summary 4')
+
+
+class RecordingEmbeddings(Embeddings):
+    """
+    Embeds texts as vowel counts and records every document text it embeds.
+    """
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [text.count(vowel) + 1.0 for vowel in 'aeiou']
+
+
+def make_meta(n):
+    """Builds the vector store metadata of a restaurant."""
+    return {'place_id': f'p{n}', 'name': f'Restaurant {n}', 'address': f'{n} Sawtelle Blvd',
+            'city': 'Los Angeles', 'rating': 4.5, 'price_level': 2, 'keywords': 'ramen',
+            'latitude': 34.04 + n / 1000, 'longitude': -118.44}
+
+
+class IngestionTests(TestCase):
+    """
+    Checks that ingestion only embeds new and changed documents, keyed by place_id,
+    and prunes stale ones.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.embeddings = RecordingEmbeddings()
+        self.store = NumpyVectorStore(os.path.join(self.directory, 'numpy_store'), self.embeddings)
+        # The checkpoint directory does not exist yet, like in a fresh checkout
+        self.checkpoint_path = os.path.join(self.directory, 'backend', 'ingest_checkpoint.jsonl')
+
+    def ingest(self, docs, **kwargs):
+        """Ingests the documents by restaurant number and returns the texts embedded."""
+        self.embeddings.embedded = []
+        helpers.split_documents_and_add_to_collection(
+            list(docs.values()), [make_meta(n) for n in docs], self.store,
+            checkpoint_path=self.checkpoint_path,
+            lexical_index_path=os.path.join(self.directory, 'lexical_index.json'),
+            geo_index_path=os.path.join(self.directory, 'geo_index.json'),
+            **kwargs
+        )
+        return self.embeddings.embedded
+
+    def test_unchanged_documents_are_not_embedded_again(self):
+        docs = {n: f'tonkotsu ramen {n}' for n in range(3)}
+        self.assertEqual(len(self.ingest(docs)), 3)
+        self.assertEqual(self.ingest(docs), [])
+        self.assertEqual(sorted(self.store.ids), ['p0', 'p1', 'p2'])
+
+    def test_changed_documents_are_embedded_again(self):
+        docs = {n: f'tonkotsu ramen {n}' for n in range(3)}
+        self.ingest(docs)
+        self.assertEqual(self.ingest({**docs, 1: 'shoyu ramen'}), ['shoyu ramen'])
+        self.assertEqual(self.store.get(ids=['p1'])['documents'], ['shoyu ramen'])
+        self.assertEqual(len(self.store.ids), 3)
+
+    def test_prune_deletes_stale_documents_but_keeps_keep_ids(self):
+        self.ingest({n: f'tonkotsu ramen {n}' for n in range(4)})
+        self.ingest({n: f'tonkotsu ramen {n}' for n in range(2)}, prune=True, keep_ids=['p2'])
+        self.assertEqual(sorted(self.store.ids), ['p0', 'p1', 'p2'])
+
+    def test_indexes_cover_documents_kept_from_earlier_runs(self):
+        self.ingest({n: f'tonkotsu ramen {n}' for n in range(5)})
+        self.ingest({n: f'tonkotsu ramen {n}' for n in range(4)}, prune=True, keep_ids=['p4'])
+        lexical = BM25Index.load(os.path.join(self.directory, 'lexical_index.json'))
+        geo = GeoIndex.load(os.path.join(self.directory, 'geo_index.json'))
+        self.assertEqual(sorted(lexical.ids), ['p0', 'p1', 'p2', 'p3', 'p4'])
+        self.assertEqual(sorted(geo.points), ['p0', 'p1', 'p2', 'p3', 'p4'])
+        self.assertEqual(lexical.search('ramen 4', k=1)[0][0], 'p4')
+
+    def test_resumes_after_the_last_written_batch(self):
+        docs = {n: f'tonkotsu ramen {n}' for n in range(5)}
+        upsert, written = self.store.upsert, []
+
+        def crash_on_second_batch(ids, *args):
+            if written:
+                raise RuntimeError('connection reset')
+            written.extend(ids)
+            upsert(ids, *args)
+
+        with mock.patch.object(self.store, 'upsert', crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                self.ingest(docs, embed_batch_size=2, upsert_batch_size=2)
+        store_key = helpers.vector_store_key(self.store)
+        self.assertEqual(sorted(helpers.read_checkpoint(self.checkpoint_path, store_key)), ['p0', 'p1'])
+
+        with mock.patch.object(helpers, 'existing_content_hashes',
+                               wraps=helpers.existing_content_hashes) as existing:
+            embedded = self.ingest(docs, embed_batch_size=2, upsert_batch_size=2)
+        self.assertEqual(embedded, [docs[n] for n in (2, 3, 4)])
+        # Checkpointed documents are not even looked up in the store
+        self.assertEqual(existing.call_args.args[1], ['p2', 'p3', 'p4'])
+        self.assertEqual(sorted(self.store.ids), ['p0', 'p1', 'p2', 'p3', 'p4'])
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_completed_run_keeps_checkpoint_entries_of_other_stores(self):
+        os.makedirs(os.path.dirname(self.checkpoint_path))
+        with open(self.checkpoint_path, 'w', encoding='utf-8') as file:
+            file.write('{"store": "chroma:restaurants", "id": "p9", "content_hash": "h9"}\n')
+            file.write('{"store": "chroma:restau')  # cut short by a crash
+        self.ingest({n: f'tonkotsu ramen {n}' for n in range(2)})
+        self.assertEqual(helpers.read_checkpoint(self.checkpoint_path, 'chroma:restaurants'), {'p9': 'h9'})
+        self.assertEqual(helpers.read_checkpoint(self.checkpoint_path,
+                                                 helpers.vector_store_key(self.store)), {})
@@ -0,0 +1,38 @@
+# pylint: disable=E0401
+# pylint: disable=C0114
+
+import os
+import tempfile
+from unittest import TestCase
+from utils.lexical_index import BM25Index, reciprocal_rank_fusion
+
+
+class LexicalIndexTests(TestCase):
+    """
+    Checks BM25 scoring, index persistence and reciprocal rank fusion.
+    """
+
+    def setUp(self):
+        self.index = BM25Index.build(
+            ['din', 'bcd', 'pizza'],
+            ['Din Tai Fung xiao long bao Arcadia',
+             'BCD Tofu House soondubu Koreatown',
+             'Pizzeria Mozza pizza pizza Melrose']
+        )
+
+    def test_ranks_exact_term_matches(self):
+        self.assertEqual(self.index.search('xiao long bao', k=3)[0][0], 'din')
+        self.assertEqual([i for i, _ in self.index.search('Koreatown tofu', k=3)], ['bcd'])
+        self.assertEqual(self.index.search('ramen', k=3), [])
+
+    def test_round_trips_through_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lexical_index.json')
+            self.index.save(path)
+            loaded = BM25Index.load(path)
+        self.assertEqual(loaded.search('pizza melrose'), self.index.search('pizza melrose'))
+
+    def test_fusion_favors_documents_ranked_by_both(self):
+        fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['d', 'b', 'e']])
+        self.assertEqual(fused[0], 'b')
+        self.assertEqual(set(fused), {'a', 'b', 'c', 'd', 'e'})
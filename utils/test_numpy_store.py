@@ -0,0 +1,87 @@
+# pylint: disable=E0401
+# pylint: disable=C0114
+
+import os
+import tempfile
+from unittest import TestCase, mock
+from utils.numpy_store import NumpyVectorStore
+
+
+class NumpyVectorStoreTests(TestCase):
+    """
+    Checks upserts, deletes, persistence, metadata filters and top-k search of the NumPy store.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'numpy_store')
+        self.store = NumpyVectorStore(self.path, embedding=None)
+        self.store.upsert(
+            ['din', 'bcd', 'mozza'],
+            [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]],
+            [{'city': 'Arcadia', 'rating': 4.5, 'price_level': 2},
+             {'city': 'Los Angeles', 'rating': 4.4, 'price_level': 1},
+             {'city': 'Los Angeles', 'rating': 4.6}],
+            ['dumplings', 'tofu soup', 'pizza'],
+        )
+
+    def search(self, embedding, k=3, where=None):
+        """Returns "<city>:<document>" for the top k documents."""
+        return [doc.metadata['city'] + ':' + doc.page_content
+                for doc in self.store.similarity_search_by_vector(embedding, k, filter=where)]
+
+    def test_upsert_replaces_existing_ids(self):
+        self.store.upsert(['bcd'], [[1.0, 0.1, 0.0]], [{'city': 'Los Angeles'}], ['tofu stew'])
+        result = self.store.get(ids=['bcd'])
+        self.assertEqual(result['documents'], ['tofu stew'])
+        self.assertEqual(result['metadatas'], [{'city': 'Los Angeles'}])
+        self.assertEqual(len(self.store.ids), 3)
+
+    def test_repeated_ids_in_one_upsert_keep_the_last(self):
+        self.store.upsert(['ramen', 'ramen'], [[1.0, 1.0, 0.0], [0.0, 1.0, 1.0]],
+                          [{'city': 'Sawtelle'}, {'city': 'Little Tokyo'}], ['tonkotsu', 'shoyu'])
+        self.assertEqual(self.store.ids, ['din', 'bcd', 'mozza', 'ramen'])
+        self.assertEqual(self.store.vectors.shape, (4, 3))
+        self.assertEqual(self.store.get(ids=['ramen'])['documents'], ['shoyu'])
+        self.assertEqual(self.search([0.0, 1.0, 1.0], k=1), ['Little Tokyo:shoyu'])
+
+    def test_delete_persists_across_reload(self):
+        self.store.delete(ids=['din', 'unknown'])
+        reloaded = NumpyVectorStore(self.path, embedding=None)
+        self.assertEqual(reloaded.ids, ['bcd', 'mozza'])
+        self.assertEqual(reloaded.vectors.shape, (2, 3))
+        self.assertEqual(reloaded.get(ids=['mozza'])['metadatas'], [{'city': 'Los Angeles', 'rating': 4.6}])
+
+    def test_where_filters(self):
+        def ids(where):
+            return self.store.get(where=where, include=[])['ids']
+        self.assertEqual(ids({'city': 'Los Angeles'}), ['bcd', 'mozza'])
+        self.assertEqual(ids({'rating': {'$gte': 4.5}}), ['din', 'mozza'])
+        self.assertEqual(ids({'price_level': {'$in': [1, 2]}}), ['din', 'bcd'])
+        self.assertEqual(ids({'$and': [{'city': {'$ne': 'Arcadia'}}, {'rating': {'$lt': 4.5}}]}), ['bcd'])
+        self.assertEqual(ids({'$or': [{'city': 'Arcadia'}, {'price_level': {'$nin': [1, 2]}}]}),
+                         ['din', 'mozza'])
+        with self.assertRaises(ValueError):
+            ids({'rating': {'$regex': '4'}})
+
+    def test_failed_upsert_leaves_the_store_unchanged(self):
+        with self.assertRaises(ValueError):
+            self.store.upsert(['bcd', 'ramen'], [[1.0, 0.0], [0.0, 1.0]],
+                              [{'city': 'Sawtelle'}, {'city': 'Sawtelle'}], ['tofu stew', 'tonkotsu'])
+        for store in (self.store, NumpyVectorStore(self.path, embedding=None)):
+            self.assertEqual(store.ids, ['din', 'bcd', 'mozza'])
+            self.assertEqual(store.vectors.shape, (3, 3))
+            self.assertEqual(store.get(ids=['bcd'])['documents'], ['tofu soup'])
+            self.assertEqual(store.get(where={'city': 'Los Angeles'}, include=[])['ids'], ['bcd', 'mozza'])
+
+        with mock.patch('utils.numpy_store.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.store.upsert(['ramen'], [[0.0, 1.0, 1.0]], [{'city': 'Sawtelle'}], ['tonkotsu'])
+        self.assertEqual(self.store.ids, ['din', 'bcd', 'mozza'])
+        self.assertNotIn('Sawtelle', self.store.columns['city'])
+
+    def test_top_k_most_similar_first(self):
+        self.assertEqual(self.search([0.9, 0.0, 0.4], k=2), ['Arcadia:dumplings', 'Los Angeles:pizza'])
+        self.assertEqual(self.search([0.9, 0.0, 0.4], k=5, where={'city': 'Los Angeles'}),
+                         ['Los Angeles:pizza', 'Los Angeles:tofu soup'])
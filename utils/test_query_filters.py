@@ -0,0 +1,76 @@
+# pylint: disable=E0401
+# pylint: disable=C0114
+
+from unittest import TestCase
+from utils.query_filters import (address_city, combine_filters, is_follow_up, parse_query_filters,
+                                 parse_query_location)
+
+
+class QueryFilterTests(TestCase):
+    """
+    Checks the metadata filters extracted from user queries.
+    """
+
+    cities = ['Los Angeles', 'West Hollywood', 'Irvine']
+
+    def test_no_filters(self):
+        self.assertIsNone(parse_query_filters('good ramen', self.cities))
+
+    def test_combines_price_city_and_rating(self):
+        self.assertEqual(parse_query_filters('Cheap tacos in Irvine, 4.5+ stars please', self.cities),
+                         {'$and': [{'price_level': {'$in': [0, 1, 2]}},
+                                   {'city': {'$eq': 'Irvine'}},
+                                   {'rating': {'$gte': 4.5}}]})
+
+    def test_maps_neighborhoods_and_prefers_longest_city(self):
+        self.assertEqual(parse_query_filters('bbq in koreatown', self.cities),
+                         {'city': {'$eq': 'Los Angeles'}})
+        self.assertEqual(parse_query_filters('fancy dinner in West Hollywood', self.cities),
+                         {'$and': [{'price_level': {'$in': [0, 3, 4]}},
+                                   {'city': {'$eq': 'West Hollywood'}}]})
+
+    def test_rating_phrasings(self):
+        for query in ('sushi rated 4.5 or higher', 'sushi, 4.5 stars and up', 'sushi rated 4.5+',
+                      'sushi with a rating of at least 4.5', 'at least 4.5 stars sushi'):
+            with self.subTest(query=query):
+                self.assertEqual(parse_query_filters(query), {'rating': {'$gte': 4.5}})
+
+    def test_numbers_without_rating_wording_are_not_ratings(self):
+        for query in ('table for 2+ people', 'tacos for a party of 4 or more', 'dim sum, 3+ dishes'):
+            with self.subTest(query=query):
+                self.assertIsNone(parse_query_filters(query))
+
+    def test_price_filters_keep_unknown_price_levels(self):
+        self.assertIn(0, parse_query_filters('cheap ramen')['price_level']['$in'])
+        self.assertIn(0, parse_query_filters('upscale sushi')['price_level']['$in'])
+
+    def test_follow_up_questions(self):
+        self.assertTrue(is_follow_up('Is it expensive?'))
+        self.assertTrue(is_follow_up('do they take reservations'))
+        self.assertTrue(is_follow_up('which of those is cheapest?'))
+        self.assertFalse(is_follow_up('cheap sushi in Irvine'))
+        self.assertFalse(is_follow_up('are there any good tacos near Little Tokyo?'))
+
+    def test_address_city(self):
+        self.assertEqual(address_city('233 E Huntington Dr, Arcadia, CA 91006, USA'), 'Arcadia')
+        self.assertEqual(address_city('Los Angeles'), '')
+
+
+class QueryLocationTests(TestCase):
+    """
+    Checks location query parsing and how location filters combine with metadata filters.
+    """
+
+    def test_parse_location(self):
+        self.assertEqual(parse_query_location('ramen near Little Tokyo'), (34.0502, -118.2401, 2.0))
+        self.assertEqual(parse_query_location('tacos within 1 km', (34.0, -118.0)),
+                         (34.0, -118.0, 1.0))
+        self.assertIsNone(parse_query_location('tacos near me'))
+        self.assertIsNone(parse_query_location('good tacos', (34.0, -118.0)))
+
+    def test_combine_filters(self):
+        near = {'place_id': {'$in': ['a']}}
+        self.assertEqual(combine_filters(None, near), near)
+        self.assertEqual(combine_filters({'$and': [{'city': {'$eq': 'Irvine'}},
+                                                   {'rating': {'$gte': 4.5}}]}, near),
+                         {'$and': [{'city': {'$eq': 'Irvine'}}, {'rating': {'$gte': 4.5}}, near]})